@@ -1,25 +1,40 @@
 import streamlit as st
-import requests
 import json
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+from collections import OrderedDict
 from datetime import datetime, timedelta
 import calendar
+import hashlib
 import logging
+import os
+import threading
+
+import expense_cache
+import expense_feed
+from expense_refresher import shared_refresher
+from expense_store import ExpenseStoreError, get_backend
+from perf_trace import span, traced
+from billing_cycles import NO_CYCLE, billing_cycle_ids, cycle_bounds
+from expense_schema import BILLING_CARDS, CATEGORIES, PAYMENT_METHODS, billing_cycle_label
 
-# Configure advanced logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-# Google Apps Script URL
-FETCH_SCRIPT_URL = "https://script.google.com/macros/s/AKfycbwISgM-mNsc6fZmKki2ImDKhsePg_Ixbcku3Ofw9_feNE9OuDUEDamLylrwK5kLB7vGZg/exec"
+# How long fetched expenses are reused before revalidating with the script
+expense_cache.shared_cache.ttl = int(os.environ.get("EXPENSE_CACHE_TTL", expense_cache.DEFAULT_TTL_SECONDS))
+
+# Columnar snapshot of the cleaned frame, reloaded on server restart; a local store
+# is its own snapshot (and must not pick up one of the script's data)
+expense_cache.shared_cache.snapshot_path = None if get_backend().local else os.environ.get(
+    "EXPENSE_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".expense_cache", "expenses.feather")
+)
 
-# Add custom CSS for better mobile responsiveness
-st.markdown("""
+# Custom CSS for better mobile responsiveness
+METRIC_CSS = """
 <style>
     /* Mobile responsive adjustments */
     @media (max-width: 768px) {
@@ -58,575 +73,1204 @@ st.markdown("""
         margin-bottom: 5px;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # Define expense theme categorization
+EXPENSE_THEMES = {
+    "Cost of living": ['Bike', 'Public transport', 'Groceries', 'Household supplies', 
+                       'Rent/Maintenance', 'Furniture', 'Services', 'Electricity', 
+                       'Internet', 'Insurance', 'Medical expenses', 'Gas', 'Phone'],
+    
+    "Going out": ['Auto/Cab', 'Eating out', 'Party', 'Cinema', 'Entertainment', 
+                  'Liquor', 'Travel', 'Games/Sports'],
+    
+    "Incidentals": ['Education', 'Gift', 'Investment', 'Flights', 'Clothes'],
+}
+
+# Reverse lookup so themes are a dict hit instead of list scans
+THEME_BY_CATEGORY = {category: theme for theme, categories in EXPENSE_THEMES.items() for category in categories}
+
+THEME_NAMES = list(EXPENSE_THEMES) + ["Other"]
+
+# Dimensions of the pre-aggregated cube; month_name rides along with month
+CUBE_DIMENSIONS = ['year', 'month', 'month_name', 'day_week', 'category', 'paymentMethod', 'theme', 'billing_cycle']
+
+# Three-letter month names indexed by month number
+MONTH_ABBRS = np.array([name[:3] for name in calendar.month_name], dtype=object)
+
+# How often the "Updated ... ago" caption re-renders on its own (seconds)
+AGE_CAPTION_SECONDS = 15
+
+# Rows requested per page of a filtered fetch
+SLICE_PAGE_SIZE = 500
+
+# Trend visualizations below the metrics
+TREND_VIEWS = ["Category Breakdown", "Trends Over Time", "Payment Methods", "Expense Themes", "Billing Cycle"]
+
+# Dark look shared by every chart, compiled once instead of an update_layout per figure
+DARK_TEMPLATE = go.layout.Template(pio.templates['plotly_dark'])
+DARK_TEMPLATE.layout.update(
+    plot_bgcolor='rgba(0,0,0,0)',
+    paper_bgcolor='rgba(0,0,0,0)',
+    margin=dict(l=20, r=20, t=40, b=20),
+    height=500,
+    legend=dict(orientation='h', yanchor='bottom', y=-0.3, xanchor='center', x=0.5),
+    autosize=True,
+)
+
+# Colors of the expense theme pie
+THEME_COLORS = {
+    "Cost of living": "#7986CB",  # Indigo-blue
+    "Going out": "#FF8A65",       # Orange
+    "Incidentals": "#4DB6AC",     # Teal
+    "Other": "#9E9E9E"            # Grey
+}
+
+# Built figures kept per server process, keyed on the aggregated data and chart options
+FIGURE_CACHE_SIZE = 64
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+figure_cache_stats = {"hits": 0, "misses": 0}
+
+# Low-cardinality string columns stored as pandas Categorical, with the values the form offers
+CATEGORICAL_COLUMNS = {'category': CATEGORIES, 'paymentMethod': PAYMENT_METHODS}
+
+# Day-of-month week labels indexed by bucket code; codes 4-7 are "29-<last day>" for 28-31 day months
+DAY_WEEK_LABELS = np.array(["01-07", "08-14", "15-21", "22-28", "29-28", "29-29", "29-30", "29-31"], dtype=object)
+
 def categorize_theme(category):
     """Map each expense category to its theme"""
-    cost_of_living = ['Bike', 'Public transport', 'Groceries', 'Household supplies', 
-                      'Rent/Maintenance', 'Furniture', 'Services', 'Electricity', 
-                      'Internet', 'Insurance', 'Medical expenses', 'Gas', 'Phone']
-    
-    going_out = ['Auto/Cab', 'Eating out', 'Party', 'Cinema', 'Entertainment', 
-                'Liquor', 'Travel', 'Games/Sports']
+    return THEME_BY_CATEGORY.get(category, "Other")
+
+def _show_script_config_error(response_text):
+    """Explain how to authorize the script when it answers with an HTML page"""
+    if "Google Apps Script" in response_text:
+        st.error("""
+        🔧 Script Configuration Required:
+        1. Open the script URL in browser
+        2. Click 'Review Permissions'
+        3. Choose your Google account
+        4. Click 'Advanced' > 'Go to [Project Name]'
+        5. Click 'Allow'
+        """)
+
+def _show_connection_error(e):
+    """Explain how the script must be deployed when it can't be reached"""
+    st.error(f"""
+    🚨 Connection Error:
+    {str(e)}
+    Verify the script is deployed as:
+    - Execute as: Me
+    - Who has access: Anyone
+    """)
+
+def _fetch_version():
+    """Ask the script for the current version token of the sheet.
+
+    The script answers ?action=version with {"version": ...} (a last-modified
+    stamp or the row count). Returns None if the script does not support it.
+    """
+    try:
+        return get_backend().query({"action": "version"}).get('version')
+    except (json.JSONDecodeError, AttributeError):
+        return None
+
+def _fetch_delta(since):
+    """Fetch only rows with a timeStamp at or after `since`.
+
+    The script answers ?since=... with {"data": [...], "since": ..., "total": ..., "version": ...},
+    total being the number of rows in the sheet.
+    A script without delta support ignores the parameter and sends the whole
+    sheet without echoing the cursor; that reply is returned as well, so the
+    caller can build the frame from it instead of downloading again.
+    """
+    return get_backend().query({"since": since, "format": expense_feed.FEED_FORMAT})
+
+def fetch_expense_periods():
+    """(year, month) pairs that have expenses, from ?action=periods.
+
+    The script answers with {"periods": [{"year", "month", "count"}, ...]}.
+    Returns None if it does not support the action; a script that ignores it
+    sends the whole sheet instead, which is kept as the full history.
+    """
+    cache = expense_cache.shared_cache
+    source = get_backend().source
+    periods = cache.get_query(('periods',))
+    if periods is not None or not cache.supports(source, 'periods'):
+        return periods
+    try:
+        payload = get_backend().query({"action": "periods", "format": expense_feed.FEED_FORMAT})
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(payload, dict) or 'periods' not in payload:
+        _keep_ignored_query_reply(source, 'periods', payload)
+        return None
+    periods = pd.DataFrame(payload['periods'], columns=['year', 'month', 'count'])
+    cache.store_query(('periods',), periods)
+    return periods
+
+@traced("fetch_expense_slice")
+def fetch_expense_slice(filters):
+    """Fetch only the expenses matching `filters`, a page at a time.
+
+    filters may hold year, month, category, paymentMethod, from and to
+    (inclusive YYYY-MM-DD dates). The script echoes the filters back with each
+    page and a nextCursor until the last one. Returns None when the reply does
+    not echo them, i.e. the script ignored the filters (its full-data reply is
+    then kept as the full history).
+    """
+    cache = expense_cache.shared_cache
+    source = get_backend().source
+    key = ('slice',) + tuple(sorted(filters.items()))
+    frame = cache.get_query(key)
+    if frame is not None:
+        cache.hits += 1
+        return frame
+    if not cache.supports(source, 'filters'):
+        return None
     
-    incidentals = ['Education', 'Gift', 'Investment', 'Flights', 'Clothes']
+    expected = {name: str(value) for name, value in filters.items()}
+    pages = []
+    cursor = None
+    while True:
+        params = {**filters, "limit": SLICE_PAGE_SIZE, "format": expense_feed.FEED_FORMAT}
+        if cursor:
+            params["cursor"] = cursor
+        try:
+            payload = get_backend().query(params)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(payload, dict) or payload.get('filters') != expected:
+            if not pages:
+                _keep_ignored_query_reply(source, 'filters', payload)
+            return None
+        pages.append(payload)
+        cursor = payload.get('nextCursor')
+        if not cursor:
+            break
     
-    if category in cost_of_living:
-        return "Cost of living"
-    elif category in going_out:
-        return "Going out"
-    elif category in incidentals:
-        return "Incidentals"
-    else:
-        return "Other"
+    cache.misses += 1
+    with span("build_frame", pages=len(pages)) as record:
+        frame = payload_expense_frame(*pages)
+        record["rows"] = len(frame)
+    cache.store_query(key, frame)
+    return frame
+
+def _keep_ignored_query_reply(source, feature, payload):
+    """Keep the full data a script sent for a query it doesn't support, and stop asking it.
+
+    Only a reply carrying the sheet shows the feature is unsupported; anything
+    else (an error) leaves the feature to be tried again.
+    """
+    if expense_feed.has_rows(payload):
+        expense_cache.shared_cache.mark_unsupported(source, feature)
+        expense_cache.shared_cache.misses += 1
+        _store_full_payload(payload)
 
-def fetch_expense_data():
+def load_expense_periods():
+    """DataFrame of the (year, month) pairs with expenses, for the filter options.
+
+    Taken from the full history when it is already held, otherwise from the
+    script so the full history isn't downloaded just to list them.
+    """
+    cache = expense_cache.shared_cache
+    cache.restore_snapshot()
+    if cache.frame is None:
+        periods = load_store_periods()
+        if periods is not None:
+            return periods
+    df = fetch_expense_data()
+    if df.empty:
+        return pd.DataFrame(columns=['year', 'month'])
+    return df[['year', 'month']].drop_duplicates()
+
+def load_store_periods():
+    """fetch_expense_periods, or None when the store can't answer it (failures are logged)"""
     try:
-        response = requests.get(FETCH_SCRIPT_URL, timeout=10)
-        
-        # Check for JSON errors
+        return fetch_expense_periods()
+    except Exception as e:
+        logger.warning(f"Could not fetch expense periods: {str(e)}")
+        return None
+
+def dashboard_filters(selected_month, selected_year):
+    """fetch_expense_slice filters for the month/year selection ("All" adds none)"""
+    filters = {}
+    if selected_year != "All":
+        filters['year'] = int(selected_year)
+    if selected_month != "All":
+        filters['month'] = list(calendar.month_name).index(selected_month)
+    return filters
+
+def load_filtered_frame(filters):
+    """Expenses matching fetch_expense_slice filters, or the full history for no filters.
+
+    A specific month and/or year is fetched as a server-side slice; the full
+    history is only downloaded for no filters. Once the full history is
+    cached (or restored from the snapshot) every selection is served from it.
+    """
+    if expense_cache.shared_cache.frame is None and filters:
         try:
-            response.json()
-        except json.JSONDecodeError:
-            if "Google Apps Script" in response.text:
-                st.error("""
-                🔧 Script Configuration Required:
-                1. Open the script URL in browser
-                2. Click 'Review Permissions'
-                3. Choose your Google account
-                4. Click 'Advanced' > 'Go to [Project Name]'
-                5. Click 'Allow'
-                """)
-            return []
+            frame = fetch_expense_slice(filters)
+        except Exception as e:
+            logger.warning(f"Sliced fetch failed, falling back to the full history: {str(e)}")
+            frame = None
+        if frame is not None:
+            return frame
+    return fetch_expense_data()
+
+def load_aggregated_cube(filters):
+    """Cube for the filters aggregated by the store itself (SQL pushdown), or None if it can't"""
+    cache = expense_cache.shared_cache
+    key = ('cube',) + tuple(sorted(filters.items()))
+    cube = cache.get_query(key)
+    if cube is None:
+        cells = get_backend().aggregate_cube(filters)
+        if cells is None:
+            return None
+        cube = cube_from_cells(cells)
+        cache.store_query(key, cube)
+    return cube
+
+def load_selection(filters, pending_rows=None):
+    """(cube, rows, queued rows) for the filters; cube is None when nothing matches.
+
+    A store that aggregates in SQL answers with the cube and no rows are
+    loaded. Cube cells are additive, so queued expenses are appended as extra cells.
+    """
+    with span("load_frame") as record:
+        aggregated = load_aggregated_cube(filters)
+        df = load_filtered_frame(filters) if aggregated is None else pd.DataFrame()
+        pending_df = pending_expense_frame(df, pending_rows)
+        record["rows"] = len(df) + len(pending_df)
+    
+    with span("build_cube") as record:
+        cubes = [aggregated if aggregated is not None else get_expense_cube(df) if not df.empty else None,
+                 build_expense_cube(pending_df) if not pending_df.empty else None]
+        cubes = [cube for cube in cubes if cube is not None and not cube.empty]
+        if not cubes:
+            return None, df, pending_df
+        cube = pd.concat(cubes, ignore_index=True) if len(cubes) > 1 else cubes[0]
+        record["rows"] = len(cube)
+    return cube, df, pending_df
+
+def sync_expense_data(force_refresh=False, revalidate=False):
+    """Bring the shared cache up to date with the store and return the cleaned frame.
+
+    A fresh cache is returned as is unless revalidate is set; force_refresh
+    skips the delta sync and downloads everything. Makes no Streamlit calls,
+    so the background refresher can run it, and raises on failure
+    (json.JSONDecodeError when the script answers with a page, not JSON,
+    ExpenseStoreError for an error reply), leaving the held data untouched.
+    """
+    cache = expense_cache.shared_cache
+    
+    # The lock makes concurrent sessions wait for one download instead of each fetching
+    with cache.fetch_lock:
+        # Cold start: pick up the on-disk snapshot before touching the network
+        cache.restore_snapshot()
+        
+        if not (force_refresh or revalidate) and cache.is_fresh():
+            cache.hits += 1
+            return cache.frame
+        
+        source = get_backend().source
+        if not force_refresh and cache.frame is not None:
+            # Expired entry: pull only rows newer than the last seen timeStamp
+            if cache.max_timestamp is not None and cache.supports(source, 'since'):
+                payload = _fetch_delta(cache.max_timestamp)
+                if isinstance(payload, dict) and payload.get('since') == cache.max_timestamp:
+                    with span("merge_delta") as record:
+                        record["rows"] = len(cache.merge(payload_expense_frame(payload), payload.get('version')))
+                    # A row that reached the sheet late with an older timeStamp (a retried
+                    # submission) is behind the cursor; only the sheet's row count shows it
+                    total = payload.get('total')
+                    if total is None or total == len(cache.frame):
+                        return cache.frame
+                    logger.info(f"Delta sync holds {len(cache.frame)} of {total} rows; downloading everything")
+                    force_refresh = True
+                else:
+                    # The cursor was ignored: the reply is the whole sheet, so keep it and stop
+                    # probing. A reply without rows (an error) proves nothing about the script
+                    if expense_feed.has_rows(payload):
+                        cache.mark_unsupported(source, 'since')
+                        cache.misses += 1
+                        _store_full_payload(payload)
+                        return cache.frame
             
-        return response.json().get('data', [])
+            # No cursor: revalidate with the cheap version call before re-downloading
+            if not force_refresh and cache.version is not None and _fetch_version() == cache.version:
+                cache.hits += 1
+                cache.touch()
+                return cache.frame
         
+        cache.misses += 1
+        _store_full_payload(get_backend().query({"format": expense_feed.FEED_FORMAT}))
+        return cache.frame
+
+def _store_full_payload(payload):
+    """Replace the shared cache with the frame built from a full-data reply"""
+    cache = expense_cache.shared_cache
+    # A reply without rows (not even an empty list) must not replace the held data
+    if not expense_feed.has_rows(payload):
+        raise ExpenseStoreError("The store's reply carries no expense data")
+    with span("build_frame") as record:
+        cache.store(payload_expense_frame(payload), payload.get('version'))
+        record["rows"] = len(cache.frame)
+
+@traced("background_refresh")
+def background_refresh():
+    """One pass of the background refresher: revalidate the held data now and pre-build its cube"""
+    frame = sync_expense_data(revalidate=True)
+    if not frame.empty:
+        with span("build_cube"):
+            get_expense_cube(frame)
+
+@traced("fetch_expense_data")
+def fetch_expense_data(force_refresh=False):
+    """Return the cleaned expense DataFrame, served from the shared cache when possible.
+
+    While the background refresher runs, whatever data is held is returned at
+    once however old it is (stale-while-revalidate); the refresher updates it.
+    """
+    cache = expense_cache.shared_cache
+    shared_refresher.mark_read()
+    if shared_refresher.running and not force_refresh:
+        cache.restore_snapshot()
+        frame = cache.frame
+        if frame is not None:
+            cache.hits += 1
+            if not cache.is_fresh() and not shared_refresher.busy:
+                shared_refresher.wake()
+            return frame
+    
+    try:
+        return sync_expense_data(force_refresh)
+    except json.JSONDecodeError as e:
+        _show_script_config_error(e.doc)
+        return cache.frame if cache.frame is not None else pd.DataFrame()
     except Exception as e:
-        st.error(f"""
-        🚨 Connection Error:
-        {str(e)}
-        Verify the script is deployed as:
-        - Execute as: Me
-        - Who has access: Anyone
-        """)
-        return []
+        # Serve the stale copy rather than an empty dashboard
+        if cache.frame is not None:
+            logger.warning(f"Expense refresh failed, serving cached data: {str(e)}")
+            return cache.frame
+        _show_connection_error(e)
+        return pd.DataFrame()
+
+def invalidate_expense_cache():
+    """Mark cached expenses stale, e.g. after a new expense was submitted, and refresh them in the background"""
+    expense_cache.shared_cache.invalidate()
+    shared_refresher.wake()
 
 def get_week_number(date_obj):
     return date_obj.isocalendar()[1]
 
-def get_day_of_month_week(date_obj):
-    """Group by the day of month, creating weekly ranges that start on the 1st"""
-    day = date_obj.day
-    # Create week ranges: 1-7, 8-14, 15-21, 22-28, 29-end of month
-    if day <= 7:
-        return "01-07"
-    elif day <= 14:
-        return "08-14"
-    elif day <= 21:
-        return "15-21"
-    elif day <= 28:
-        return "22-28"
+def build_expense_frame(rows):
+    """Convert raw expense rows into a typed DataFrame with the derived analysis columns"""
+    return payload_expense_frame({"data": rows})
+
+def payload_expense_frame(*payloads):
+    """Typed, enriched DataFrame from one or more fetch replies (pages) in either feed format"""
+    frames = [frame for frame in map(expense_feed.decode_payload, payloads) if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    return enrich_expenses(df)
+
+def enrich_expenses(df):
+    """Add the derived year/month/day_week/theme columns using vectorized operations"""
+    dates = df['date'].dt
+    day = dates.day.to_numpy()
+    
+    # Add week number for weekly analysis
+    df['year'] = dates.year
+    df['month'] = dates.month
+    df['month_name'] = np.array(calendar.month_name, dtype=object)[df['month'].to_numpy()]
+    
+    # Create day-of-month based week ranges (1-7, 8-14, etc.); days 29+ are
+    # bucketed by month length so the label ends on the month's last day
+    week_codes = np.minimum((day - 1) // 7, 4)
+    week_codes = np.where(week_codes == 4, dates.days_in_month.to_numpy() - 24, week_codes)
+    df['day_week'] = DAY_WEEK_LABELS[week_codes]
+    
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = categorical_column(column, df[column])
+    
+    df['theme'] = theme_column(df['category'])
+    
+    # Integer billing cycle id of card payments (NO_CYCLE otherwise), so historical rows
+    # without a billingCycle stamp are sliced by statement period too
+    df['billing_cycle'] = billing_cycle_ids(df['date'], df['paymentMethod'])
+    return df
+
+def categorical_column(column, values):
+    """values of a CATEGORICAL_COLUMNS column as a Categorical with an explicit dtype.
+
+    Categories are the form's values, then any others present, sorted, so frames
+    and cubes holding the same values get equal dtypes whether they were built
+    from the columnar feed, row dicts or cells aggregated by the store.
+    """
+    # Factorize once, then recode through the (small) category index
+    values = values.astype('category')
+    # Only categories in use: the columnar feed adds "" to every dictionary
+    codes = values.cat.codes.to_numpy()
+    used = np.bincount(codes[codes >= 0], minlength=len(values.cat.categories)) > 0
+    known = CATEGORICAL_COLUMNS[column]
+    known_values = set(known)
+    others = sorted((value for value in values.cat.categories[used] if value not in known_values), key=str)
+    # set_categories, not astype: unordered dtypes with the same set compare equal, so astype keeps the order
+    return values.cat.set_categories(known + others)
+
+def theme_column(category):
+    """Theme of every row of a categorical category column.
+
+    Each distinct category is mapped once and broadcast through the category
+    codes (code -1, a missing category, picks "Other").
+    """
+    theme_codes = np.array([THEME_NAMES.index(categorize_theme(name)) for name in category.cat.categories]
+                           + [THEME_NAMES.index("Other")])
+    return pd.Categorical.from_codes(theme_codes[category.cat.codes.to_numpy()], categories=THEME_NAMES)
+
+def cube_from_cells(cells):
+    """build_expense_cube's layout from cells a store aggregated itself (see aggregate_cube)"""
+    cube = pd.DataFrame({'year': cells['year'].astype(np.int32), 'month': cells['month'].astype(np.int32)})
+    cube['month_name'] = np.array(calendar.month_name, dtype=object)[cube['month'].to_numpy()]
+    first_date = pd.to_datetime(cells['first_date'])
+    # Same day-of-month buckets as enrich_expenses; codes 4-7 end on the month's last day
+    week_codes = cells['week'].to_numpy()
+    week_codes = np.where(week_codes == 4, first_date.dt.days_in_month.to_numpy() - 24, week_codes)
+    cube['day_week'] = DAY_WEEK_LABELS[week_codes]
+    for column in CATEGORICAL_COLUMNS:
+        cube[column] = categorical_column(column, cells[column])
+    cube['theme'] = theme_column(cube['category'])
+    cube['billing_cycle'] = cells['billing_cycle'].astype(np.int64)
+    cube['amount'] = cells['amount'].astype(float)
+    cube['count'] = cells['count'].astype(np.int64)
+    cube['first_date'] = first_date
+    cube['last_date'] = pd.to_datetime(cells['last_date'])
+    return cube
+
+def build_expense_cube(df):
+    """Pre-aggregate expenses into sum/count cells over every dimension the dashboard slices by.
+
+    first_date/last_date keep the date span of each cell so the daily average
+    can still be computed without the raw rows.
+    """
+    return df.groupby(CUBE_DIMENSIONS, observed=True, dropna=False).agg(
+        amount=('amount', 'sum'),
+        count=('amount', 'size'),
+        first_date=('date', 'min'),
+        last_date=('date', 'max'),
+    ).reset_index()
+
+def get_expense_cube(df):
+    """Return the aggregate cube for the cached dataset, built once per dataset version"""
+    return expense_cache.shared_cache.derive(df, 'cube', lambda: build_expense_cube(df))
+
+def add_period_labels(grouped, view):
+    """Add a display label and an integer sort_key to grouped weekly/monthly totals.
+
+    Weekly keys are YYYYMMDD of the bucket's first day, monthly keys YYYYMM, so
+    the rows are ordered chronologically by a numeric sort instead of strings.
+    """
+    year = grouped['year'].astype(int)
+    month = grouped['month'].astype(int)
+    month_abbr = pd.Series(MONTH_ABBRS[month.to_numpy()], index=grouped.index)
+    
+    if view == "Weekly":
+        day_week = grouped['day_week'].astype(str)
+        first_day = day_week.str[:2].astype(int)
+        grouped['week_label'] = day_week + " " + month_abbr + " " + year.astype(str)
+        grouped['sort_key'] = year * 10000 + month * 100 + first_day
+    else:
+        grouped['month_label'] = month_abbr + " " + year.astype(str)
+        grouped['sort_key'] = year * 100 + month
+    
+    return grouped.sort_values('sort_key', kind='stable')
+
+def frame_fingerprint(df):
+    """Content hash of a small aggregated frame, including its column names"""
+    digest = hashlib.sha1(",".join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+def cached_figure(builder, data, *options):
+    """Return builder(data, *options), reusing the figure built earlier for equal inputs.
+
+    Figures are shared between sessions, so callers must not modify them.
+    """
+    with span("figure", builder=builder.__name__, rows=len(data)) as record:
+        return _cached_figure(builder, data, options, record)
+
+def _cached_figure(builder, data, options, record):
+    key = (builder.__name__, frame_fingerprint(data), options)
+    with _figure_cache_lock:
+        record["cached"] = key in _figure_cache
+        if key in _figure_cache:
+            _figure_cache.move_to_end(key)
+            figure_cache_stats["hits"] += 1
+            return _figure_cache[key]
+    figure = builder(data, *options)
+    with _figure_cache_lock:
+        figure_cache_stats["misses"] += 1
+        _figure_cache[key] = figure
+        while len(_figure_cache) > FIGURE_CACHE_SIZE:
+            _figure_cache.popitem(last=False)
+    return figure
+
+def build_category_figure(category_totals, title):
+    """Horizontal bar chart of per-category totals"""
+    fig = px.bar(
+        category_totals, 
+        x='amount', 
+        y='category',
+        orientation='h',
+        title=title,
+        labels={'amount': 'Amount (₹)', 'category': 'Category'},
+        text='amount',
+        template=DARK_TEMPLATE
+    )
+    fig.update_layout(
+        height=max(400, len(category_totals) * 30),  # Dynamic height based on number of categories
+        yaxis={'categoryorder': 'total ascending'},  # Sort categories by value
+    )
+    # Format text on bars
+    fig.update_traces(
+        texttemplate='₹%{text:,.0f}',
+        textposition='outside'
+    )
+    return fig
+
+def build_trend_figure(grouped, label_column, axis_title, title):
+    """Line chart of per-category totals over weekly or monthly period labels"""
+    fig = px.line(
+        grouped, 
+        x=label_column, 
+        y='amount', 
+        color='category',
+        markers=True,
+        title=title,
+        labels={'amount': 'Amount (₹)', label_column: axis_title, 'category': 'Category'},
+        category_orders={label_column: grouped[label_column].unique()},
+        template=DARK_TEMPLATE
+    )
+    fig.update_traces(
+        line=dict(width=1),
+        marker=dict(size=12)
+    )
+    return fig
+
+def build_share_figure(totals, name_column, hole, title):
+    """Donut chart of each name's share of the total; themes get their fixed colors"""
+    if name_column == 'theme':
+        colors = [THEME_COLORS.get(theme, "#9E9E9E") for theme in totals['theme']]
     else:
-        # Get the last day of the month
-        last_day = calendar.monthrange(date_obj.year, date_obj.month)[1]
-        return f"29-{last_day}"
+        colors = px.colors.qualitative.Set3
+    fig = go.Figure(data=[go.Pie(
+        labels=totals[name_column],  # Use the names directly
+        values=totals['amount'],
+        hole=hole,
+        textinfo='label',  # Show the label text instead of just percentage
+        hovertemplate='%{label}<br>Amount: ₹%{value:.2f}<br>%{percent}<extra></extra>',  # Removed "trace 0" with <extra></extra>
+        marker_colors=colors
+    )])
+    fig.update_layout(template=DARK_TEMPLATE, title=title)
+    return fig
+
+def build_cycle_figure(cycle_totals, title):
+    """Bar chart of card spend per billing cycle"""
+    fig = px.bar(
+        cycle_totals,
+        x='cycle_label',
+        y='amount',
+        color='paymentMethod',
+        title=title,
+        labels={'amount': 'Amount (₹)', 'cycle_label': 'Billing cycle', 'paymentMethod': 'Card'},
+        category_orders={'cycle_label': cycle_totals['cycle_label'].unique()},
+        text='amount',
+        template=DARK_TEMPLATE
+    )
+    fig.update_traces(texttemplate='₹%{text:,.0f}', textposition='outside')
+    return fig
+
+def show_figure(fig):
+    """st.plotly_chart, timed: Streamlit serializes the whole figure to JSON here"""
+    with span("plotly_chart"):
+        st.plotly_chart(fig, use_container_width=True)
+
+def share_labels(names, amounts, percentages):
+    """Build "<name>: ₹<amount> (<pct>%)" labels for pie/donut totals"""
+    return (names.astype(str) + ": ₹" + amounts.map('{:,.2f}'.format)
+            + " (" + percentages.astype(str) + "%)")
+
+def pending_expense_frame(df, pending_rows):
+    """Enriched frame of locally queued expenses the fetched data doesn't contain yet"""
+    if not pending_rows:
+        return pd.DataFrame()
+    # A row whose acknowledgement was lost may already be in the sheet
+    if 'idempotencyKey' in df.columns:
+        synced_keys = set(df['idempotencyKey'].dropna().astype(str))
+        pending_rows = [row for row in pending_rows if row.get('idempotencyKey') not in synced_keys]
+    return build_expense_frame(pending_rows)
+
+def format_age(seconds):
+    """Rough age for display: "just now", "45 s ago", "3 min ago", "2 h ago", "4 days ago" """
+    if seconds < 10:
+        return "just now"
+    if seconds < 60:
+        return f"{seconds:.0f} s ago"
+    if seconds < 3600:
+        return f"{seconds // 60:.0f} min ago"
+    if seconds < 86400:
+        return f"{seconds // 3600:.0f} h ago"
+    return f"{seconds // 86400:.0f} days ago"
+
+@st.fragment(run_every=AGE_CAPTION_SECONDS)
+def show_data_age():
+    """How old the held dataset is; reruns on its own so the age keeps counting"""
+    age = expense_cache.shared_cache.synced_age()
+    if age is None:
+        return
+    note = " · refreshing in the background" if shared_refresher.busy else ""
+    st.caption(f"🕒 Updated {format_age(age)}{note}")
+
+@st.fragment(run_every=2)
+def wait_for_first_refresh(showing_slices=False):
+    """Placeholder until the background refresher holds a dataset; reruns the page once it does.
 
-def show_analytics():
-    """Main analytics function with dark theme and requested visualizations"""
+    With showing_slices the dashboard is rendered from server-side slices
+    meanwhile, and only a note about the download is shown.
+    """
+    if expense_cache.shared_cache.frame is not None:
+        st.rerun()
+    # Someone is waiting, so failed passes keep being retried
+    shared_refresher.mark_read()
+    if showing_slices:
+        st.caption("⏳ Showing the selected period while your full history downloads in the background.")
+    else:
+        st.info("⏳ Fetching your expenses in the background. The dashboard appears as soon as they arrive.")
+    error = shared_refresher.last_exception
+    if error is not None:
+        # Same setup help as a failed foreground fetch
+        if isinstance(error, json.JSONDecodeError):
+            _show_script_config_error(error.doc)
+        else:
+            _show_connection_error(error)
+        st.caption(f"Last attempt failed ({type(error).__name__}). Retrying every {shared_refresher.retry}s.")
+
+def show_analytics_error(e):
+    """Log an analytics failure and show it in place of the dashboard"""
+    logger.error(f"💣 Analytics failure: {str(e)}", exc_info=True)
+    st.error(f"""
+    🚨 Critical Error:
+    We've hit an unexpected problem: {str(e)}
+    Please screenshot this error and contact support.
+    """)
+
+@traced("show_analytics")
+def show_analytics(pending_rows=None):
+    """Main analytics function with dark theme and requested visualizations.
+
+    pending_rows are submissions still queued locally; they are counted so the
+    dashboard reflects new expenses before the script acknowledges them.
+    """
     try:
+        # Injected on every run: a module-level call would only style the first run
+        st.markdown(METRIC_CSS, unsafe_allow_html=True)
+        
         st.title("💰 Expense Analytics Dashboard")
         st.caption("Track and analyze your spending patterns")
         
-        with st.spinner("🔍 Loading financial insights..."):
-            raw_data = fetch_expense_data()
-            
-            if not raw_data:
-                st.info("📭 No expense records found")
-                return
-                
-            # Convert raw data to pandas DataFrame
-            df = pd.DataFrame(raw_data)
+        # With the background refresher the page never waits on the full download. On the
+        # very first start (no snapshot yet) the selected period is fetched as a slice
+        # meanwhile; a store that can't list its periods shows a placeholder instead
+        periods = None
+        if shared_refresher.running:
+            expense_cache.shared_cache.restore_snapshot()
+            if expense_cache.shared_cache.frame is None:
+                with st.spinner("🔍 Loading financial insights..."), span("load_periods"):
+                    periods = load_store_periods()
+                wait_for_first_refresh(showing_slices=periods is not None)
+                if periods is None:
+                    return
+        if periods is None:
+            show_data_age()
+            with st.spinner("🔍 Loading financial insights..."), span("load_periods"):
+                periods = load_expense_periods()
             
-            # Basic data cleaning and type conversion
-            df['amount'] = pd.to_numeric(df['amount'])
-            df['date'] = pd.to_datetime(df['date'])
-            
-            # Add week number for weekly analysis
-            df['year'] = df['date'].apply(lambda x: x.year)
-            df['month'] = df['date'].apply(lambda x: x.month)
-            df['month_name'] = df['date'].apply(lambda x: calendar.month_name[x.month])
-            # Create day-of-month based week ranges (1-7, 8-14, etc.)
-            df['day_week'] = df['date'].apply(get_day_of_month_week)
-            
-            # Add expense theme categorization
-            df['theme'] = df['category'].apply(categorize_theme)
-            
-            # Get unique months for the filter
-            month_options = sorted(df['month_name'].unique(), 
-                                  key=lambda x: list(calendar.month_name).index(x) if x in calendar.month_name else 0)
-            year_options = sorted(df['year'].unique())
-            
-            # Get current month data
-            now = datetime.now()
-            current_month = now.month
-            current_year = now.year
-            
-            # Add space before filters
-            st.markdown("<div style='margin-top: 30px;'></div>", unsafe_allow_html=True)
-            
-            # Add filters without header - CREATE FILTERS FIRST
-            filter_col1, filter_col2 = st.columns([1, 1])
-            
-            # Add "All" option for month and year filters
-            with filter_col1:
-                month_options_with_all = ["All"] + sorted(month_options, 
-                                  key=lambda x: list(calendar.month_name).index(x) if x in calendar.month_name else 0)
-                current_month_name = calendar.month_name[current_month]
-                
-                selected_month = st.selectbox(
-                    "Select Month", 
-                    options=month_options_with_all,
-                    index=month_options_with_all.index(current_month_name) if current_month_name in month_options_with_all else 0
-                )
-            
-            with filter_col2:
-                year_options_with_all = ["All"] + sorted(year_options)
-                
-                selected_year = st.selectbox(
-                    "Select Year",
-                    options=year_options_with_all,
-                    index=year_options_with_all.index(current_year) if current_year in year_options_with_all[1:] else 0
-                )
-            
-            # NOW Filter data based on selection
-            filtered_df = df.copy()
-            
-            # Apply month filter if not "All"
-            if selected_month != "All":
-                selected_month_num = list(calendar.month_name).index(selected_month)
-                filtered_df = filtered_df[filtered_df['month'] == selected_month_num]
-                
-            # Apply year filter if not "All"
-            if selected_year != "All":
-                filtered_df = filtered_df[filtered_df['year'] == selected_year]
-            
-            # Create period label for metrics
-            if selected_month != "All" and selected_year != "All":
-                period_label = f"{selected_month} {selected_year}"
-                metric_title = f"Total Spent - {selected_month}"
-            elif selected_month != "All":
-                period_label = f"{selected_month} (All Years)"
-                metric_title = f"Total Spent - {selected_month}"
-            elif selected_year != "All":
-                period_label = f"All Months {selected_year}"
-                metric_title = f"Total Spent - {selected_year}"
+        # Queued expenses count towards the filter options too
+        if pending_rows:
+            pending_periods = build_expense_frame(pending_rows)[['year', 'month']]
+            periods = pd.concat([periods[['year', 'month']], pending_periods], ignore_index=True)
+        
+        if periods.empty:
+            st.info("📭 No expense records found")
+            return
+        
+        # Filters, metrics and charts rerun on their own when a filter changes
+        show_dashboard(periods, pending_rows)
+        
+    except Exception as e:
+        show_analytics_error(e)
+
+@st.fragment
+@traced("show_dashboard")
+def show_dashboard(periods, pending_rows=None):
+    """Filters, metrics and the selected trend view.
+
+    periods lists the (year, month) pairs with expenses. A fragment: changing a
+    filter reruns this function alone and fetches only what the selection needs.
+    """
+    try:
+        # Get unique months for the filter
+        month_options = [calendar.month_name[month] for month in sorted(periods['month'].astype(int).unique())]
+        year_options = sorted(periods['year'].astype(int).unique())
+
+        # Get current month data
+        now = datetime.now()
+        current_month = now.month
+        current_year = now.year
+
+        # Add space before filters
+        st.markdown("<div style='margin-top: 30px;'></div>", unsafe_allow_html=True)
+
+        # Add filters without header - CREATE FILTERS FIRST
+        filter_col1, filter_col2 = st.columns([1, 1])
+
+        # Add "All" option for month and year filters
+        with filter_col1:
+            month_options_with_all = ["All"] + sorted(month_options, 
+                              key=lambda x: list(calendar.month_name).index(x) if x in calendar.month_name else 0)
+            current_month_name = calendar.month_name[current_month]
+
+            selected_month = st.selectbox(
+                "Select Month", 
+                options=month_options_with_all,
+                index=month_options_with_all.index(current_month_name) if current_month_name in month_options_with_all else 0
+            )
+
+        with filter_col2:
+            year_options_with_all = ["All"] + sorted(year_options)
+
+            selected_year = st.selectbox(
+                "Select Year",
+                options=year_options_with_all,
+                index=year_options_with_all.index(current_year) if current_year in year_options_with_all[1:] else 0
+            )
+
+        filters = dashboard_filters(selected_month, selected_year)
+        if not filters and expense_cache.shared_cache.frame is None and shared_refresher.running:
+            # Only the full history answers "All"; the refresher is still downloading it
+            st.info("All-time figures appear once your full history has downloaded. "
+                    "Pick a month or year to see it now.")
+            return
+
+        # Every view below is answered from the pre-aggregated cube, not the raw rows
+        with st.spinner("🔍 Loading financial insights..."):
+            cube, df, pending_df = load_selection(filters, pending_rows)
+
+        if cube is None:
+            st.info("No expense data available for the selected filters")
+            return
+
+        if not pending_df.empty:
+            st.caption(f"⏳ Includes {len(pending_df)} expense(s) waiting to sync")
+
+        # NOW Filter data based on selection
+        filtered_cube = cube
+
+        # Apply month filter if not "All"
+        if selected_month != "All":
+            selected_month_num = list(calendar.month_name).index(selected_month)
+            filtered_cube = filtered_cube[filtered_cube['month'] == selected_month_num]
+
+        # Apply year filter if not "All"
+        if selected_year != "All":
+            filtered_cube = filtered_cube[filtered_cube['year'] == selected_year]
+
+        # Create period label for metrics
+        if selected_month != "All" and selected_year != "All":
+            period_label = f"{selected_month} {selected_year}"
+            metric_title = f"Total Spent - {selected_month}"
+        elif selected_month != "All":
+            period_label = f"{selected_month} (All Years)"
+            metric_title = f"Total Spent - {selected_month}"
+        elif selected_year != "All":
+            period_label = f"All Months {selected_year}"
+            metric_title = f"Total Spent - {selected_year}"
+        else:
+            period_label = "All Time"
+            metric_title = "Total Spent - All Time"
+
+        # Chart title parts
+        month_title = selected_month if selected_month != "All" else "All Months"
+        year_title = selected_year if selected_year != "All" else "All Years"
+
+        # Create layout with three columns for the metrics
+        col1, col2, col3 = st.columns(3)
+
+        # 1. Dynamic tracker of total amount spent based on selected filters
+        with col1:
+            total_spent = filtered_cube['amount'].sum() if not filtered_cube.empty else 0
+            st.markdown(f"""
+            <div class="metric-container">
+                <div class="metric-label">{metric_title}</div>
+                <div class="metric-value">₹{total_spent:,.2f}</div>
+                <div>{period_label}</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+        # Average daily expense based on filtered data
+        with col2:
+            if not filtered_cube.empty:
+                # Get the earliest and latest dates in filtered data
+                first_expense_date = filtered_cube['first_date'].min().date()
+                last_expense_date = filtered_cube['last_date'].max().date()
+
+                # Calculate inclusive date range
+                days_in_range = (last_expense_date - first_expense_date).days + 1
+
+                # Safety check to avoid division by zero
+                if days_in_range < 1:
+                    days_in_range = 1
             else:
-                period_label = "All Time"
-                metric_title = "Total Spent - All Time"
-            
-            # Create layout with three columns for the metrics
-            col1, col2, col3 = st.columns(3)
-            
-            # 1. Dynamic tracker of total amount spent based on selected filters
-            with col1:
-                total_spent = filtered_df['amount'].sum() if not filtered_df.empty else 0
+                days_in_range = 1  # Default if no data
+
+            avg_daily = total_spent / days_in_range if days_in_range > 0 else 0
+            st.markdown(f"""
+            <div class="metric-container">
+                <div class="metric-label">Average Daily Expense</div>
+                <div class="metric-value">₹{avg_daily:,.2f}</div>
+                <div>Based on {days_in_range} days</div>
+            </div>
+            """, unsafe_allow_html=True)
+
+        # Top spending category (skip Rent/Maintenance if it's the highest)
+        with col3:
+            if not filtered_cube.empty:
+                category_amounts = filtered_cube.groupby('category', observed=True)['amount'].sum().sort_values(ascending=False)
+
+                # Check if top category is Rent/Maintenance and get next highest if so
+                if len(category_amounts) > 0:
+                    top_category = category_amounts.index[0]
+                    top_amount = category_amounts.iloc[0]
+
+                    # If top category is Rent/Maintenance and there are other categories, show the next one
+                    if top_category == "Rent/Maintenance" and len(category_amounts) > 1:
+                        top_category = category_amounts.index[1]
+                        top_amount = category_amounts.iloc[1]
+                        category_note = "(Next highest after Rent)"
+                    else:
+                        category_note = ""
+
                 st.markdown(f"""
                 <div class="metric-container">
-                    <div class="metric-label">{metric_title}</div>
-                    <div class="metric-value">₹{total_spent:,.2f}</div>
-                    <div>{period_label}</div>
+                    <div class="metric-label">Top Spending Category</div>
+                    <div class="metric-value">{top_category}</div>
+                    <div>₹{top_amount:,.2f} {category_note}</div>
                 </div>
                 """, unsafe_allow_html=True)
-                
-            # Average daily expense based on filtered data
-            with col2:
-                if not filtered_df.empty:
-                    # Get the earliest and latest dates in filtered data
-                    first_expense_date = filtered_df['date'].min().date()
-                    last_expense_date = filtered_df['date'].max().date()
-                    
-                    # Calculate inclusive date range
-                    days_in_range = (last_expense_date - first_expense_date).days + 1
-                    
-                    # Safety check to avoid division by zero
-                    if days_in_range < 1:
-                        days_in_range = 1
-                else:
-                    days_in_range = 1  # Default if no data
-                    
-                avg_daily = total_spent / days_in_range if days_in_range > 0 else 0
+            else:
                 st.markdown(f"""
                 <div class="metric-container">
-                    <div class="metric-label">Average Daily Expense</div>
-                    <div class="metric-value">₹{avg_daily:,.2f}</div>
-                    <div>Based on {days_in_range} days</div>
+                    <div class="metric-label">Top Spending Category</div>
+                    <div class="metric-value">No Data</div>
+                    <div>No expenses for {period_label}</div>
                 </div>
                 """, unsafe_allow_html=True)
-                
-            # Top spending category (skip Rent/Maintenance if it's the highest)
-            with col3:
-                if not filtered_df.empty:
-                    category_amounts = filtered_df.groupby('category')['amount'].sum().sort_values(ascending=False)
-                    
-                    # Check if top category is Rent/Maintenance and get next highest if so
-                    if len(category_amounts) > 0:
-                        top_category = category_amounts.index[0]
-                        top_amount = category_amounts.iloc[0]
-                        
-                        # If top category is Rent/Maintenance and there are other categories, show the next one
-                        if top_category == "Rent/Maintenance" and len(category_amounts) > 1:
-                            top_category = category_amounts.index[1]
-                            top_amount = category_amounts.iloc[1]
-                            category_note = "(Next highest after Rent)"
-                        else:
-                            category_note = ""
-                    
-                    st.markdown(f"""
-                    <div class="metric-container">
-                        <div class="metric-label">Top Spending Category</div>
-                        <div class="metric-value">{top_category}</div>
-                        <div>₹{top_amount:,.2f} {category_note}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                else:
-                    st.markdown(f"""
-                    <div class="metric-container">
-                        <div class="metric-label">Top Spending Category</div>
-                        <div class="metric-value">No Data</div>
-                        <div>No expenses for {period_label}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-            
-            st.markdown("</div>", unsafe_allow_html=True)
-            
-            # Add some space before the trends section
-            st.markdown("<br>", unsafe_allow_html=True)
-            
-            # Trends section header
-            st.markdown("<hr style='margin: 30px 0;'>", unsafe_allow_html=True)
-            st.header("📊 Expense Analysis")
-            
-            # Create sub-tabs for different trend visualizations
-            trend_tabs = st.tabs(["Category Breakdown", "Trends Over Time", "Payment Methods", "Expense Themes"])
-            
-            with trend_tabs[0]:
-                # NEW: Category breakdown view
-                st.subheader("💳 Spend by Category")
-                
-                if not filtered_df.empty:
-                    # Aggregate expenses by category
-                    category_totals = filtered_df.groupby('category')['amount'].sum().reset_index()
-                    category_totals = category_totals.sort_values('amount', ascending=False)
-                    
-                    # Calculate percentages
-                    total = category_totals['amount'].sum()
-                    category_totals['percentage'] = (category_totals['amount'] / total * 100).round(1)
-                    
-                    # Create horizontal bar chart for better category name visibility
-                    fig_category = px.bar(
-                        category_totals, 
-                        x='amount', 
-                        y='category',
-                        orientation='h',
-                        title=f'Spending by Category - {selected_month if selected_month != "All" else "All Months"} {selected_year if selected_year != "All" else "All Years"}',
-                        labels={'amount': 'Amount (₹)', 'category': 'Category'},
-                        text='amount'
-                    )
-                    
-                    # Customize the theme to match dark mode and improve mobile responsiveness
-                    fig_category.update_layout(
-                        template='plotly_dark',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        height=max(400, len(category_totals) * 30),  # Dynamic height based on number of categories
-                        yaxis={'categoryorder': 'total ascending'},  # Sort categories by value
-                        autosize=True,
-                    )
-                    
-                    # Format text on bars
-                    fig_category.update_traces(
-                        texttemplate='₹%{text:,.0f}',
-                        textposition='outside'
-                    )
-                    
-                    st.plotly_chart(fig_category, use_container_width=True)
-                    
-                    # Show detailed table
-                    st.subheader("📋 Category Details")
-                    
-                    # Format the table for better display
-                    display_df = category_totals.copy()
-                    display_df['amount'] = display_df['amount'].apply(lambda x: f"₹{x:,.2f}")
-                    display_df['percentage'] = display_df['percentage'].apply(lambda x: f"{x}%")
-                    display_df.columns = ['Category', 'Amount', 'Percentage']
-                    display_df.index = range(1, len(display_df) + 1)
-                    
-                    st.dataframe(display_df, use_container_width=True)
+
+        st.markdown("</div>", unsafe_allow_html=True)
+
+        # Add some space before the trends section
+        st.markdown("<br>", unsafe_allow_html=True)
+
+        # Trends section header
+        st.markdown("<hr style='margin: 30px 0;'>", unsafe_allow_html=True)
+        st.header("📊 Expense Analysis")
+
+        # Pick one trend visualization; unlike st.tabs, only the selected view is computed
+        trend_view = st.segmented_control("View", TREND_VIEWS, default=TREND_VIEWS[0],
+                                          key="trend_view", label_visibility="collapsed")
+        # Clicking the selected option again clears it; keep showing the first view
+        trend_view = trend_view or TREND_VIEWS[0]
+        
+        show_trend_view(trend_view, filtered_cube, selected_month, selected_year, month_title, year_title, pending_rows)
+
+        # Add expander for debugging data
+        with st.expander("🔧 Debug Data Preview", expanded=False):
+            st.dataframe(df.head(3))
+            st.write("Data shape:", df.shape)
+            st.write("Aggregate cube shape:", cube.shape)
+            st.write("Storage backend:", get_backend().label)
+            cache = expense_cache.shared_cache
+            st.write("Cache:", {
+                "version": cache.version,
+                "full_history": cache.frame is not None,
+                "age_seconds": round(cache.age() or 0, 1),
+                "ttl_seconds": cache.ttl,
+                "hits": cache.hits,
+                "misses": cache.misses,
+                "delta_syncs": cache.delta_syncs,
+                "cached_queries": len(cache.queries),
+                "last_timestamp": cache.max_timestamp,
+            })
+            st.write("Figure cache:", {**figure_cache_stats, "size": len(_figure_cache)})
+            st.write("Background refresher:", shared_refresher.stats())
+            if not df.empty:
+                st.write("Date range:", df['date'].min(), "to", df['date'].max())
+    except Exception as e:
+        show_analytics_error(e)
+
+@st.fragment
+@traced("show_trend_view")
+def show_trend_view(trend_view, filtered_cube, selected_month, selected_year, month_title, year_title, pending_rows=None):
+    """Aggregation and chart of one trend view; its own widgets rerun only this fragment"""
+    try:
+        if trend_view == "Category Breakdown":
+            # NEW: Category breakdown view
+            st.subheader("💳 Spend by Category")
+
+            if not filtered_cube.empty:
+                # Aggregate expenses by category
+                with span("aggregate"):
+                    category_totals = filtered_cube.groupby('category', observed=True)['amount'].sum().reset_index()
+                category_totals = category_totals.sort_values('amount', ascending=False)
+
+                # Calculate percentages
+                total = category_totals['amount'].sum()
+                category_totals['percentage'] = (category_totals['amount'] / total * 100).round(1)
+
+                # Create horizontal bar chart for better category name visibility
+                fig_category = cached_figure(build_category_figure, category_totals[['category', 'amount']],
+                                             f'Spending by Category - {month_title} {year_title}')
+
+                show_figure(fig_category)
+
+                # Show detailed table
+                st.subheader("📋 Category Details")
+
+                # Format the table for better display
+                display_df = category_totals.copy()
+                display_df['amount'] = display_df['amount'].apply(lambda x: f"₹{x:,.2f}")
+                display_df['percentage'] = display_df['percentage'].apply(lambda x: f"{x}%")
+                display_df.columns = ['Category', 'Amount', 'Percentage']
+                display_df.index = range(1, len(display_df) + 1)
+
+                st.dataframe(display_df, use_container_width=True)
+            else:
+                st.info(f"No expense data available for the selected filters")
+
+        elif trend_view == "Trends Over Time":
+            # ENHANCED: Toggle between weekly and monthly trends
+            st.subheader("📈 Trends Over Time")
+
+            # Add toggle for weekly vs monthly view
+            view_type = st.radio(
+                "Select View",
+                options=["Weekly", "Monthly"],
+                horizontal=True,
+                help="Weekly view shows weeks within selected month. Monthly view shows months within selected year."
+            )
+
+            if view_type == "Weekly":
+                # Weekly view (existing functionality with some modifications)
+                if selected_month == "All":
+                    st.info("Please select a specific month to view weekly trends")
                 else:
-                    st.info(f"No expense data available for the selected filters")
-            
-            with trend_tabs[1]:
-                # ENHANCED: Toggle between weekly and monthly trends
-                st.subheader("📈 Trends Over Time")
-                
-                # Add toggle for weekly vs monthly view
-                view_type = st.radio(
-                    "Select View",
-                    options=["Weekly", "Monthly"],
-                    horizontal=True,
-                    help="Weekly view shows weeks within selected month. Monthly view shows months within selected year."
-                )
-                
-                if view_type == "Weekly":
-                    # Weekly view (existing functionality with some modifications)
-                    if selected_month == "All":
-                        st.info("Please select a specific month to view weekly trends")
-                    else:
-                        # Filter to selected month and year
-                        if selected_year != "All":
-                            monthly_df = filtered_df[(filtered_df['month'] == list(calendar.month_name).index(selected_month)) & 
-                                                   (filtered_df['year'] == selected_year)]
-                        else:
-                            monthly_df = filtered_df[filtered_df['month'] == list(calendar.month_name).index(selected_month)]
-                        
-                        if not monthly_df.empty:
-                            # Create day-of-month based week aggregation
-                            weekly_category = monthly_df.groupby(['year', 'month', 'day_week', 'category'])['amount'].sum().reset_index()
-                            
-                            # Create week labels showing the day range in the month
-                            weekly_category['week_label'] = weekly_category.apply(
-                                lambda x: f"{x['day_week']} {calendar.month_name[x['month']][:3]} {x['year']}", axis=1
-                            )
-                            
-                            # Create a sort key based on year, month, and day range
-                            weekly_category['sort_key'] = weekly_category.apply(
-                                lambda x: f"{x['year']:04d}{x['month']:02d}{int(x['day_week'].split('-')[0]):02d}", axis=1
-                            )
-                            
-                            # Sort by the combined key for proper chronological order
-                            weekly_category = weekly_category.sort_values('sort_key')
-                            
-                            # Create the line chart
-                            week_labels = weekly_category['week_label'].unique()
-                            
-                            fig_weekly = px.line(
-                                weekly_category, 
-                                x='week_label', 
-                                y='amount', 
-                                color='category',
-                                markers=True,
-                                title=f'Weekly Expenses by Category - {selected_month} {selected_year if selected_year != "All" else "All Years"}',
-                                labels={'amount': 'Amount (₹)', 'week_label': 'Week', 'category': 'Category'},
-                                category_orders={'week_label': week_labels}
-                            )
-                            
-                            # Customize the theme
-                            fig_weekly.update_layout(
-                                template='plotly_dark',
-                                plot_bgcolor='rgba(0,0,0,0)',
-                                paper_bgcolor='rgba(0,0,0,0)',
-                                legend=dict(orientation='h', yanchor='bottom', y=-0.3, xanchor='center', x=0.5),
-                                margin=dict(l=20, r=20, t=40, b=20),
-                                height=500,
-                                autosize=True,
-                            )
-                            
-                            fig_weekly.update_traces(
-                                line=dict(width=1),
-                                marker=dict(size=12)
-                            )
-                            
-                            st.plotly_chart(fig_weekly, use_container_width=True)
-                        else:
-                            st.info(f"No expense data available for {selected_month} {selected_year if selected_year != 'All' else ''}")
-                
-                else:  # Monthly view
-                    # Monthly trends - show monthly aggregation
+                    # Filter to selected month and year
                     if selected_year != "All":
-                        yearly_df = filtered_df[filtered_df['year'] == selected_year]
-                        title_suffix = f" - {selected_year}"
+                        monthly_cube = filtered_cube[(filtered_cube['month'] == list(calendar.month_name).index(selected_month)) & 
+                                                     (filtered_cube['year'] == selected_year)]
                     else:
-                        yearly_df = filtered_df
-                        title_suffix = " - All Years"
-                    
-                    if not yearly_df.empty:
-                        # Create monthly aggregation by category
-                        monthly_category = yearly_df.groupby(['year', 'month', 'month_name', 'category'])['amount'].sum().reset_index()
-                        
-                        # Create month labels
-                        monthly_category['month_label'] = monthly_category.apply(
-                            lambda x: f"{x['month_name'][:3]} {x['year']}", axis=1
-                        )
-                        
-                        # Sort by year and month
-                        monthly_category['sort_key'] = monthly_category.apply(
-                            lambda x: f"{x['year']:04d}{x['month']:02d}", axis=1
-                        )
-                        monthly_category = monthly_category.sort_values('sort_key')
-                        
+                        monthly_cube = filtered_cube[filtered_cube['month'] == list(calendar.month_name).index(selected_month)]
+
+                    if not monthly_cube.empty:
+                        # Create day-of-month based week aggregation
+                        with span("aggregate"):
+                            weekly_category = monthly_cube.groupby(['year', 'month', 'day_week', 'category'], observed=True)['amount'].sum().reset_index()
+
+                        # Week labels and a numeric sort key for proper chronological order
+                        weekly_category = add_period_labels(weekly_category, "Weekly")
+
                         # Create the line chart
-                        month_labels = monthly_category['month_label'].unique()
-                        
-                        fig_monthly = px.line(
-                            monthly_category, 
-                            x='month_label', 
-                            y='amount', 
-                            color='category',
-                            markers=True,
-                            title=f'Monthly Expenses by Category{title_suffix}',
-                            labels={'amount': 'Amount (₹)', 'month_label': 'Month', 'category': 'Category'},
-                            category_orders={'month_label': month_labels}
-                        )
-                        
-                        # Customize the theme
-                        fig_monthly.update_layout(
-                            template='plotly_dark',
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            paper_bgcolor='rgba(0,0,0,0)',
-                            legend=dict(orientation='h', yanchor='bottom', y=-0.3, xanchor='center', x=0.5),
-                            margin=dict(l=20, r=20, t=40, b=20),
-                            height=500,
-                            autosize=True,
-                        )
-                        
-                        fig_monthly.update_traces(
-                            line=dict(width=1),
-                            marker=dict(size=12)
+                        fig_weekly = cached_figure(
+                            build_trend_figure, weekly_category[['week_label', 'category', 'amount']], 'week_label', 'Week',
+                            f'Weekly Expenses by Category - {selected_month} {year_title}'
                         )
-                        
-                        st.plotly_chart(fig_monthly, use_container_width=True)
+
+                        show_figure(fig_weekly)
                     else:
-                        st.info(f"No expense data available for the selected filters")
-                
-            with trend_tabs[2]:
-                # 3. Donut chart of spend distribution by payment methods
-                if not filtered_df.empty:
-                    payment_totals = filtered_df.groupby('paymentMethod')['amount'].sum().reset_index()
-                    
-                    # Calculate percentages
-                    total = payment_totals['amount'].sum()
-                    payment_totals['percentage'] = (payment_totals['amount'] / total * 100).round(1)
-                    
-                    # Add percentage to labels
-                    payment_totals['label'] = payment_totals.apply(
-                        lambda x: f"{x['paymentMethod']}: ₹{x['amount']:,.2f} ({x['percentage']}%)", axis=1
-                    )
-                    
-                    # Create donut chart with payment method names as labels
-                    fig_donut = go.Figure(data=[go.Pie(
-                        labels=payment_totals['paymentMethod'],  # Use payment method names directly
-                        values=payment_totals['amount'],
-                        hole=0.5,
-                        textinfo='label',  # Show the label text instead of just percentage
-                        hovertemplate='%{label}<br>Amount: ₹%{value:.2f}<br>%{percent}<extra></extra>',  # Removed "trace 0" with <extra></extra>
-                        marker_colors=px.colors.qualitative.Set3
-                    )])
-                    
-                    # Customize the theme to match dark mode and improve mobile responsiveness
-                    fig_donut.update_layout(
-                        template='plotly_dark',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        height=500,
-                        title=f'Payment Method Distribution - {selected_month if selected_month != "All" else "All Months"} {selected_year if selected_year != "All" else "All Years"}',
-                        legend=dict(
-                            orientation="h",
-                            yanchor="bottom",
-                            y=-0.3,
-                            xanchor="center",
-                            x=0.5
-                        ),
-                        # Improve responsiveness
-                        autosize=True,
-                    )
-                    
-                    st.plotly_chart(fig_donut, use_container_width=True)
+                        st.info(f"No expense data available for {selected_month} {selected_year if selected_year != 'All' else ''}")
+
+            else:  # Monthly view
+                # Monthly trends - show monthly aggregation
+                if selected_year != "All":
+                    yearly_cube = filtered_cube[filtered_cube['year'] == selected_year]
+                    title_suffix = f" - {selected_year}"
                 else:
-                    st.info(f"No expense data available for the selected filters")
-            
-            with trend_tabs[3]:
-                # 4. NEW: Pie chart of expense themes
-                if not filtered_df.empty:
-                    # Aggregate expenses by theme
-                    theme_totals = filtered_df.groupby('theme')['amount'].sum().reset_index()
-                    
-                    # Calculate percentages
-                    theme_total = theme_totals['amount'].sum()
-                    theme_totals['percentage'] = (theme_totals['amount'] / theme_total * 100).round(1)
-                    
-                    # Add percentage to labels
-                    theme_totals['label'] = theme_totals.apply(
-                        lambda x: f"{x['theme']}: ₹{x['amount']:,.2f} ({x['percentage']}%)", axis=1
-                    )
-                    
-                    # Define custom colors for each theme - improved color palette
-                    theme_colors = {
-                        "Cost of living": "#7986CB",  # Indigo-blue
-                        "Going out": "#FF8A65",       # Orange
-                        "Incidentals": "#4DB6AC",     # Teal
-                        "Other": "#9E9E9E"            # Grey
-                    }
-                    
-                    # Extract colors in the same order as themes
-                    color_sequence = [theme_colors.get(theme, "#9E9E9E") for theme in theme_totals['theme']]
-                    
-                    # Create pie chart for themes with theme names as labels
-                    fig_theme = go.Figure(data=[go.Pie(
-                        labels=theme_totals['theme'],  # Use theme names directly
-                        values=theme_totals['amount'],
-                        hole=0.4,
-                        textinfo='label',  # Show the label text instead of just percentage
-                        hovertemplate='%{label}<br>Amount: ₹%{value:.2f}<br>%{percent}<extra></extra>',  # Removed "trace 0" with <extra></extra>
-                        marker_colors=color_sequence
-                    )])
-                    
-                    # Customize the theme to match dark mode and improve mobile responsiveness
-                    fig_theme.update_layout(
-                        template='plotly_dark',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        margin=dict(l=20, r=20, t=40, b=20),
-                        height=500,
-                        title=f'Expense Distribution by Theme - {selected_month if selected_month != "All" else "All Months"} {selected_year if selected_year != "All" else "All Years"}',
-                        legend=dict(
-                            orientation="h",
-                            yanchor="bottom",
-                            y=-0.3,
-                            xanchor="center",
-                            x=0.5
-                        ),
-                        # Improve responsiveness
-                        autosize=True,
+                    yearly_cube = filtered_cube
+                    title_suffix = " - All Years"
+
+                if not yearly_cube.empty:
+                    # Create monthly aggregation by category
+                    with span("aggregate"):
+                        monthly_category = yearly_cube.groupby(['year', 'month', 'month_name', 'category'], observed=True)['amount'].sum().reset_index()
+
+                    # Month labels, sorted by year and month
+                    monthly_category = add_period_labels(monthly_category, "Monthly")
+
+                    # Create the line chart
+                    fig_monthly = cached_figure(
+                        build_trend_figure, monthly_category[['month_label', 'category', 'amount']], 'month_label', 'Month',
+                        f'Monthly Expenses by Category{title_suffix}'
                     )
-                    
-                    st.plotly_chart(fig_theme, use_container_width=True)
-                    
-                    # Add theme category details as an expander
-                    with st.expander("What's included in each theme?", expanded=False):
-                        st.markdown(f"""
-                        <div style='margin: 10px 0;'>
-                            <p><b>Cost of living:</b> Bike, Public transport, Groceries, Household supplies, Rent/Maintenance, Furniture, Services, Electricity, Internet, Insurance, Medical expenses, Gas, Phone</p>
-                            <p><b>Going out:</b> Auto/Cab, Eating out, Party, Cinema, Entertainment, Liquor, Travel, Games/Sports</p>
-                            <p><b>Incidentals:</b> Education, Gift, Investment, Flights, Clothes</p>
-                        </div>
-                        """, unsafe_allow_html=True)
+
+                    show_figure(fig_monthly)
                 else:
                     st.info(f"No expense data available for the selected filters")
-            
-            # Add expander for debugging data
-            with st.expander("🔧 Debug Data Preview", expanded=False):
-                st.json(raw_data[:3] if raw_data else {})
-                st.write("Data shape:", df.shape)
-                if not df.empty:
-                    st.write("Date range:", df['date'].min(), "to", df['date'].max())
-                    
+
+        elif trend_view == "Payment Methods":
+            # 3. Donut chart of spend distribution by payment methods
+            if not filtered_cube.empty:
+                with span("aggregate"):
+                    payment_totals = filtered_cube.groupby('paymentMethod', observed=True)['amount'].sum().reset_index()
+
+                # Calculate percentages
+                total = payment_totals['amount'].sum()
+                payment_totals['percentage'] = (payment_totals['amount'] / total * 100).round(1)
+
+                # Add percentage to labels
+                payment_totals['label'] = share_labels(payment_totals['paymentMethod'], payment_totals['amount'], payment_totals['percentage'])
+
+                # Create donut chart with payment method names as labels
+                fig_donut = cached_figure(build_share_figure, payment_totals[['paymentMethod', 'amount']], 'paymentMethod', 0.5,
+                                          f'Payment Method Distribution - {month_title} {year_title}')
+
+                show_figure(fig_donut)
+            else:
+                st.info(f"No expense data available for the selected filters")
+
+        elif trend_view == "Billing Cycle":
+            show_billing_cycles(selected_month, selected_year, pending_rows)
+
+        elif trend_view == "Expense Themes":
+            # 4. NEW: Pie chart of expense themes
+            if not filtered_cube.empty:
+                # Aggregate expenses by theme
+                with span("aggregate"):
+                    theme_totals = filtered_cube.groupby('theme', observed=True)['amount'].sum().reset_index()
+
+                # Calculate percentages
+                theme_total = theme_totals['amount'].sum()
+                theme_totals['percentage'] = (theme_totals['amount'] / theme_total * 100).round(1)
+
+                # Add percentage to labels
+                theme_totals['label'] = share_labels(theme_totals['theme'], theme_totals['amount'], theme_totals['percentage'])
+
+                # Create pie chart for themes with theme names as labels
+                fig_theme = cached_figure(build_share_figure, theme_totals[['theme', 'amount']], 'theme', 0.4,
+                                          f'Expense Distribution by Theme - {month_title} {year_title}')
+
+                show_figure(fig_theme)
+
+                # Add theme category details as an expander
+                with st.expander("What's included in each theme?", expanded=False):
+                    st.markdown(f"""
+                    <div style='margin: 10px 0;'>
+                        <p><b>Cost of living:</b> Bike, Public transport, Groceries, Household supplies, Rent/Maintenance, Furniture, Services, Electricity, Internet, Insurance, Medical expenses, Gas, Phone</p>
+                        <p><b>Going out:</b> Auto/Cab, Eating out, Party, Cinema, Entertainment, Liquor, Travel, Games/Sports</p>
+                        <p><b>Incidentals:</b> Education, Gift, Investment, Flights, Clothes</p>
+                    </div>
+                    """, unsafe_allow_html=True)
+            else:
+                st.info(f"No expense data available for the selected filters")
     except Exception as e:
-        logger.error(f"💣 Analytics failure: {str(e)}", exc_info=True)
-        st.error(f"""
-        🚨 Critical Error:
-        We've hit an unexpected problem: {str(e)}
-        Please screenshot this error and contact support.
-        """)
+        show_analytics_error(e)
+
+@traced("show_billing_cycles")
+def show_billing_cycles(selected_month, selected_year, pending_rows=None):
+    """Card spend per billing cycle, with cycle-to-date totals for the open cycles.
+
+    Shows every cycle that overlaps the selected month/year: the one closing in
+    it and the one opening in it. A cycle straddles two months, so its rows are
+    loaded by date range rather than by month.
+    """
+    st.subheader("🧾 Billing Cycles")
+    
+    # Cycle ids overlapping the selection (None = no bound); a month on its own matches every year
+    selected_month_num = list(calendar.month_name).index(selected_month) if selected_month != "All" else None
+    if selected_year != "All":
+        months = [selected_month_num] if selected_month_num else range(1, 13)
+        closing = [int(selected_year) * 12 + month - 1 for month in months]
+        cycle_ids = sorted(set(closing) | {cycle_id + 1 for cycle_id in closing})
+    else:
+        cycle_ids = None
+    
+    filters = {}
+    if cycle_ids is not None:
+        starts = [cycle_bounds([min(cycle_ids)], card["statement_day"])[0][0] for card in BILLING_CARDS.values()]
+        ends = [cycle_bounds([max(cycle_ids)], card["statement_day"])[1][0] for card in BILLING_CARDS.values()]
+        filters = {'from': str(min(starts)), 'to': str(max(ends))}
+    
+    cube = load_selection(filters, pending_rows)[0]
+    if cube is None:
+        st.info("No expense data available for the selected filters")
+        return
+    
+    cards = cube[cube['billing_cycle'] != NO_CYCLE]
+    if cycle_ids is not None:
+        cards = cards[cards['billing_cycle'].isin(cycle_ids)]
+    elif selected_month_num:
+        cards = cards[(cards['billing_cycle'] % 12).isin([selected_month_num - 1, selected_month_num % 12])]
+    if cards.empty:
+        st.info("No card expenses in the billing cycles of the selected period")
+        return
+    
+    cycle_totals = cards.groupby(['billing_cycle', 'paymentMethod'], observed=True).agg(
+        amount=('amount', 'sum'), count=('count', 'sum')
+    ).reset_index().sort_values('billing_cycle', kind='stable')
+    cycle_totals['cycle_label'] = [
+        billing_cycle_label(cycle_id, BILLING_CARDS[method]["statement_day"])
+        for cycle_id, method in zip(cycle_totals['billing_cycle'], cycle_totals['paymentMethod'].astype(str))
+    ]
+    
+    # Cycle-to-date spend of each card's currently open cycle
+    today = pd.Timestamp(datetime.now().date())
+    open_cycles = billing_cycle_ids([today] * len(BILLING_CARDS), list(BILLING_CARDS))
+    metric_cols = st.columns(len(BILLING_CARDS))
+    for col, (method, card), cycle_id in zip(metric_cols, BILLING_CARDS.items(), open_cycles):
+        if cycle_ids is not None and cycle_id not in cycle_ids:
+            continue
+        if selected_month_num and cycle_id % 12 not in (selected_month_num - 1, selected_month_num % 12):
+            continue
+        spent = cycle_totals.loc[(cycle_totals['billing_cycle'] == cycle_id)
+                                 & (cycle_totals['paymentMethod'].astype(str) == method), 'amount'].sum()
+        start, end = cycle_bounds([cycle_id], card["statement_day"])
+        days_in_cycle = int((end[0] - start[0]).astype(int)) + 1
+        days_elapsed = int((np.datetime64(today.date()) - start[0]).astype(int)) + 1
+        with col:
+            st.markdown(f"""
+            <div class="metric-container">
+                <div class="metric-label">{method} - cycle to date</div>
+                <div class="metric-value">₹{spent:,.2f}</div>
+                <div>Day {days_elapsed} of {days_in_cycle} · statement on {pd.Timestamp(end[0]):%d %b}</div>
+            </div>
+            """, unsafe_allow_html=True)
+    
+    fig_cycles = cached_figure(build_cycle_figure, cycle_totals[['cycle_label', 'paymentMethod', 'amount']],
+                               "Card Spend by Billing Cycle")
+    show_figure(fig_cycles)
+    
+    # Statement periods with their date ranges
+    details = []
+    for row in cycle_totals.itertuples(index=False):
+        start, end = cycle_bounds([row.billing_cycle], BILLING_CARDS[str(row.paymentMethod)]["statement_day"])
+        details.append({
+            "Billing cycle": row.cycle_label,
+            "Card": str(row.paymentMethod),
+            "From": pd.Timestamp(start[0]).strftime("%d %b %Y"),
+            "To": pd.Timestamp(end[0]).strftime("%d %b %Y"),
+            "Expenses": int(row.count),
+            "Amount": f"₹{row.amount:,.2f}",
+        })
+    st.dataframe(pd.DataFrame(details, index=range(1, len(details) + 1)), use_container_width=True)
@@ -0,0 +1,166 @@
+import json
+import os
+import random
+import threading
+import time
+import logging
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from perf_trace import span
+
+logger = logging.getLogger(__name__)
+
+# Google Apps Script URL
+# (APPS_SCRIPT_URL points the app at another deployment or at stand_in_server.py)
+SCRIPT_URL = os.environ.get(
+    "APPS_SCRIPT_URL",
+    "https://script.google.com/macros/s/AKfycbwISgM-mNsc6fZmKki2ImDKhsePg_Ixbcku3Ofw9_feNE9OuDUEDamLylrwK5kLB7vGZg/exec"
+)
+
+# (connect, read) timeouts in seconds so a slow script can't hang a Streamlit worker
+TIMEOUT = (5, 20)
+
+# Statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 0.5
+
+JSON_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json"
+}
+
+# Latency of the most recent calls, shown in the Debug tab
+call_log = deque(maxlen=200)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Process-wide pooled session, so calls reuse keep-alive TLS connections"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def get(params=None):
+    """GET the script, retrying rate limits, server errors and connection failures"""
+    return _request("GET", params=params, retry_statuses=RETRY_STATUSES, idempotent=True)
+
+
+def post(data, headers=None, idempotent=False):
+    """POST to the script.
+
+    Unless the payload is idempotent (carries an idempotencyKey the script
+    dedupes on), only 429s and failures to connect are retried: after a 5xx or
+    a read timeout the script may already have appended the row, and a blind
+    retry would duplicate it.
+    """
+    retry_statuses = RETRY_STATUSES if idempotent else {429}
+    return _request("POST", data=data, headers=headers, retry_statuses=retry_statuses, idempotent=idempotent)
+
+
+def parse_reply(response):
+    """Turn a script response into its {"status": ..., "message": ...} reply dict"""
+    if response.status_code == 200:
+        try:
+            return response.json()
+        except json.JSONDecodeError:
+            return {"status": "error", "message": "Failed to parse response JSON"}
+    else:
+        return {"status": "error", "message": f"HTTP Status: {response.status_code}"}
+
+
+def submit_json(data, idempotent=None):
+    """POST a JSON payload and return the script's reply dict; never raises.
+
+    Safe to call from background threads (no Streamlit calls).
+    """
+    if idempotent is None:
+        idempotent = "idempotencyKey" in data
+    # Queue worker submissions get a trace of their own in the Debug tab
+    with span("submit_json", rows=len(data.get("rows", [data]))):
+        try:
+            return parse_reply(post(json.dumps(data), headers=JSON_HEADERS, idempotent=idempotent))
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+
+def submit_batch(rows):
+    """Append many rows in one POST; every row must carry an idempotencyKey.
+
+    The script answers {"action": "batch", "rows": [...]} with
+    {"status", "inserted", "duplicates"}.
+    """
+    return submit_json({"action": "batch", "rows": rows}, idempotent=True)
+
+
+def _request(method, retry_statuses, params=None, data=None, headers=None, idempotent=False):
+    params = params or {}
+    # Label for the call log: an explicit action, a delta sync, a filtered slice or the full data
+    action = params.get('action') or ('since' if 'since' in params else
+                                      'slice' if set(params) - {'format'} else '')
+    with span(f"apps_script.{method.lower()}", action=action) as record:
+        response = _send(method, action, retry_statuses, params, data, headers, idempotent)
+        record["status"] = response.status_code
+        record["bytes"] = len(response.content)
+        return response
+
+
+def _send(method, action, retry_statuses, params, data, headers, idempotent):
+    started = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            response = get_session().request(
+                method, SCRIPT_URL, params=params, data=data, headers=headers, timeout=TIMEOUT
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            # A read timeout means the request reached the script, which may have acted on it
+            retryable = idempotent or not isinstance(e, requests.ReadTimeout)
+            if attempt > MAX_RETRIES or not retryable:
+                _record(method, action, None, started, attempt, str(e))
+                raise
+            logger.warning(f"{method} attempt {attempt} failed: {str(e)}")
+        else:
+            if response.status_code not in retry_statuses or attempt > MAX_RETRIES:
+                _record(method, action, response.status_code, started, attempt,
+                        size=int(response.headers.get('Content-Length') or len(response.content)))
+                return response
+            logger.warning(f"{method} attempt {attempt} returned HTTP {response.status_code}")
+
+        # Exponential backoff with jitter: 0.5s, 1s, 2s (+ up to 50%)
+        delay = BACKOFF_SECONDS * (2 ** (attempt - 1))
+        time.sleep(delay + random.uniform(0, delay / 2))
+
+
+def _record(method, action, status, started, attempts, error=None, size=None):
+    latency_ms = (time.perf_counter() - started) * 1000
+    call_log.append({
+        "time": time.strftime("%H:%M:%S"),
+        "method": method,
+        "action": action,
+        "status": status,
+        "attempts": attempts,
+        "latency_ms": round(latency_ms, 1),
+        # Bytes on the wire (compressed, when the script gzips the reply)
+        "bytes": size,
+        "error": error,
+    })
+    logger.debug(f"{method} {action or 'data'} -> {status} in {latency_ms:.0f} ms ({attempts} attempt(s))")
+
+
+def recent_calls():
+    """Snapshot of the call log, newest first"""
+    return list(reversed(call_log))
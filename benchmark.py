@@ -0,0 +1,315 @@
+"""Benchmark the analytics data pipeline on a seeded synthetic ledger.
+
+Times each stage the Trends tab goes through, from the fetched rows to the
+Plotly figures, at several ledger sizes:
+
+    python benchmark.py                                  # 1k, 100k and 1M rows
+    python benchmark.py --sizes 1000 100000 --output baseline.json
+    python benchmark.py --output new.json --compare baseline.json   # exit 1 on a regression
+    python benchmark.py --sizes 10000 100000 1000000 --apply-baseline
+
+--apply-baseline adds an apply_baseline stage: the per-row .apply derivation
+the dashboard used before enrich_expenses, timed on the same typed frame as
+derive_columns (and checked to produce the same values), so the two can be
+compared directly. It is slow (seconds per million rows) and left out by default.
+
+Timings only compare well on the same machine, so by default results go to
+the git-ignored .benchmarks/ directory as a local baseline. A reference
+baseline recorded at the default sizes is committed as benchmark_baseline.json
+(its header names the Python version and machine). On other hardware it only
+catches gross regressions, so compare against it with a looser tolerance:
+
+    python benchmark.py --output new.json --compare benchmark_baseline.json --tolerance 2
+
+Streamlit is replaced by a no-op stub before analytics is imported, so no
+server or session is needed and widget calls cost nothing. Each stage runs
+--repeat times and the fastest run is kept, which is the least noisy
+estimate on a shared machine.
+"""
+import argparse
+import calendar
+import json
+import os
+import platform
+import sys
+import time
+import types
+from datetime import datetime
+
+import numpy as np
+
+from expense_schema import CATEGORIES, PAYMENT_METHODS
+
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".benchmarks", "baseline.json")
+
+# A stage counts as regressed when it is this many times slower than the baseline
+DEFAULT_TOLERANCE = 1.5
+# Slowdowns smaller than this (seconds) are within run-to-run noise, e.g. of the figure builds
+MIN_REGRESSION_SECONDS = 0.05
+
+# Rough shape of a personal ledger: a few categories and methods dominate
+CATEGORY_WEIGHTS = {"Groceries": 18, "Eating out": 16, "Auto/Cab": 12, "Rent/Maintenance": 2, "Miscellaneous": 8,
+                    "Household supplies": 6, "Party": 4, "Electricity": 1, "Internet": 1, "Phone": 1}
+PAYMENT_WEIGHTS = {"Credit card": 40, "GPay UPI": 30, "Cred UPI": 12, "Cash": 10, "Debit card": 5,
+                   "Net Banking": 2, "Pine Perks": 1}
+MERCHANTS = ["Swiggy", "Zepto", "Uber", "Ola", "BigBasket", "Amazon", "Starbucks", "DMart", "Airtel", "BESCOM",
+             "Landlord", "PVR", "Decathlon", "Apollo", "Blinkit"]
+SHARED_SHARE = 0.15
+# Last day of the synthetic ledger, fixed so a seed yields the same rows on any day
+LEDGER_END = "2026-06-30"
+
+# Theme lists as the pre-vectorization categorize_theme scanned them, for --apply-baseline
+APPLY_THEME_LISTS = [
+    ("Cost of living", ['Bike', 'Public transport', 'Groceries', 'Household supplies', 'Rent/Maintenance',
+                        'Furniture', 'Services', 'Electricity', 'Internet', 'Insurance', 'Medical expenses',
+                        'Gas', 'Phone']),
+    ("Going out", ['Auto/Cab', 'Eating out', 'Party', 'Cinema', 'Entertainment', 'Liquor', 'Travel',
+                   'Games/Sports']),
+    ("Incidentals", ['Education', 'Gift', 'Investment', 'Flights', 'Clothes']),
+]
+
+
+def _stub_streamlit():
+    """Install a do-nothing streamlit module; decorators return the function unchanged"""
+    class _NoOp:
+        def __call__(self, *args, **kwargs):
+            if len(args) == 1 and callable(args[0]) and not kwargs:
+                return args[0]
+            return self
+
+        def __getattr__(self, name):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def __iter__(self):
+            return iter(())
+
+    module = types.ModuleType("streamlit")
+    module.__getattr__ = lambda name: _NoOp()
+    sys.modules["streamlit"] = module
+
+
+def _weighted(rng, weights, size):
+    names = list(weights)
+    probabilities = np.array([weights[name] for name in names], dtype=float)
+    return np.array(names, dtype=object)[rng.choice(len(names), size=size, p=probabilities / probabilities.sum())]
+
+
+def generate_ledger(rows, seed=42, years=3, end=LEDGER_END):
+    """Seeded list of expense rows in the shape the Apps Script returns, over the `years` up to `end`"""
+    assert set(CATEGORY_WEIGHTS) <= set(CATEGORIES) and set(PAYMENT_WEIGHTS) <= set(PAYMENT_METHODS)
+    rng = np.random.default_rng(seed)
+    end = np.datetime64(end, 'D')
+    dates = end - rng.integers(0, 365 * years, size=rows).astype('timedelta64[D]')
+    dates.sort()
+    seconds = rng.integers(8 * 3600, 23 * 3600, size=rows).astype('timedelta64[s]')
+    stamps = np.datetime_as_string(dates.astype('datetime64[s]') + seconds, unit='s')
+    dates = np.datetime_as_string(dates, unit='D')
+    categories = _weighted(rng, CATEGORY_WEIGHTS, rows)
+    methods = _weighted(rng, PAYMENT_WEIGHTS, rows)
+    merchants = np.array(MERCHANTS, dtype=object)[rng.integers(0, len(MERCHANTS), size=rows)]
+    amounts = np.round(rng.lognormal(mean=5.5, sigma=1.0, size=rows), 2)
+    shared = rng.random(rows) < SHARED_SHARE
+    split_between = rng.integers(2, 5, size=rows)
+
+    ledger = []
+    for i in range(rows):
+        row = {
+            "expenseName": merchants[i],
+            "category": categories[i],
+            "amount": amounts[i] / split_between[i] if shared[i] else amounts[i],
+            "originalAmount": amounts[i],
+            "date": dates[i],
+            "paymentMethod": methods[i],
+            "shared": "Yes" if shared[i] else "No",
+            "timeStamp": stamps[i].replace("T", " "),
+        }
+        if shared[i]:
+            row["splitBetween"] = int(split_between[i])
+            row["splitAmount"] = row["amount"]
+        ledger.append(row)
+    return ledger
+
+
+def _apply_theme(category):
+    for theme, categories in APPLY_THEME_LISTS:
+        if category in categories:
+            return theme
+    return "Other"
+
+
+def _apply_day_of_month_week(date_obj):
+    day = date_obj.day
+    if day <= 7:
+        return "01-07"
+    elif day <= 14:
+        return "08-14"
+    elif day <= 21:
+        return "15-21"
+    elif day <= 28:
+        return "22-28"
+    return f"29-{calendar.monthrange(date_obj.year, date_obj.month)[1]}"
+
+
+def apply_derive_columns(df):
+    """The derived columns computed row by row with .apply, as before enrich_expenses"""
+    df['year'] = df['date'].apply(lambda x: x.year)
+    df['month'] = df['date'].apply(lambda x: x.month)
+    df['month_name'] = df['date'].apply(lambda x: calendar.month_name[x.month])
+    df['day_week'] = df['date'].apply(_apply_day_of_month_week)
+    df['theme'] = df['category'].apply(_apply_theme)
+    return df
+
+
+def _best_of(repeat, stage):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = stage()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_pipeline(rows, repeat=3, apply_baseline=False):
+    """Time every stage for one ledger; returns {stage: seconds}"""
+    import pandas as pd
+    import plotly.io as pio
+    import analytics
+    import expense_feed
+
+    timings = {}
+
+    def timed(name, stage):
+        timings[name], result = _best_of(repeat, stage)
+        return result
+
+    ledger = generate_ledger(rows)
+    columnar = expense_feed.encode_columnar(ledger)
+
+    raw = timed("construct_frame", lambda: pd.DataFrame(ledger))
+
+    def convert(frame=raw):
+        frame = frame.copy()
+        frame['amount'] = pd.to_numeric(frame['amount'])
+        frame['date'] = pd.to_datetime(frame['date'])
+        return frame
+    typed = timed("convert_types", convert)
+    timed("decode_columnar", lambda: expense_feed.decode_payload(columnar))
+
+    df = timed("derive_columns", lambda: analytics.enrich_expenses(typed.copy()))
+    if apply_baseline:
+        old = timed("apply_baseline", lambda: apply_derive_columns(typed.copy()))
+        for column in ['year', 'month', 'month_name', 'day_week', 'theme']:
+            assert (old[column].to_numpy() == df[column].astype(object).to_numpy()).all(), column
+    cube = timed("build_cube", lambda: analytics.build_expense_cube(df))
+
+    latest = df['date'].max()
+    month, year = int(latest.month), int(latest.year)
+    month_cube = timed("filter_month", lambda: cube[(cube['month'] == month) & (cube['year'] == year)])
+    year_cube = timed("filter_year", lambda: cube[cube['year'] == year])
+
+    category_totals = timed("groupby_category", lambda: month_cube.groupby('category', observed=True)['amount']
+                            .sum().reset_index().sort_values('amount', ascending=False))
+    weekly = timed("groupby_weekly", lambda: analytics.add_period_labels(
+        month_cube.groupby(['year', 'month', 'day_week', 'category'], observed=True)['amount'].sum().reset_index(),
+        "Weekly"))
+    monthly = timed("groupby_monthly", lambda: analytics.add_period_labels(
+        year_cube.groupby(['year', 'month', 'month_name', 'category'], observed=True)['amount'].sum().reset_index(),
+        "Monthly"))
+    payments = timed("groupby_payment", lambda: month_cube.groupby('paymentMethod', observed=True)['amount']
+                     .sum().reset_index())
+    themes = timed("groupby_theme", lambda: month_cube.groupby('theme', observed=True)['amount'].sum().reset_index())
+    cycles = timed("groupby_billing_cycle", lambda: cube[cube['billing_cycle'] != analytics.NO_CYCLE]
+                   .groupby(['billing_cycle', 'paymentMethod'], observed=True)['amount'].sum().reset_index())
+    cycles['cycle_label'] = cycles['billing_cycle'].astype(str)
+
+    # Builders are called directly: cached_figure would only time the cache after the first repeat
+    figures = {
+        "figure_category": lambda: analytics.build_category_figure(category_totals[['category', 'amount']], "bench"),
+        "figure_weekly": lambda: analytics.build_trend_figure(
+            weekly[['week_label', 'category', 'amount']], 'week_label', 'Week', "bench"),
+        "figure_monthly": lambda: analytics.build_trend_figure(
+            monthly[['month_label', 'category', 'amount']], 'month_label', 'Month', "bench"),
+        "figure_payment": lambda: analytics.build_share_figure(payments, 'paymentMethod', 0.5, "bench"),
+        "figure_theme": lambda: analytics.build_share_figure(themes, 'theme', 0.4, "bench"),
+        "figure_billing_cycle": lambda: analytics.build_cycle_figure(
+            cycles[['cycle_label', 'paymentMethod', 'amount']], "bench"),
+    }
+    for name, build in figures.items():
+        figure = timed(name, build)
+        # st.plotly_chart serializes every figure it is given
+        timed(name.replace("figure_", "serialize_"), lambda: pio.to_json(figure, validate=False))
+
+    return timings
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Stages slower than tolerance x their baseline, as printable lines"""
+    regressions = []
+    for size, stages in results.items():
+        for stage, seconds in stages.items():
+            before = baseline.get(size, {}).get(stage)
+            if before is None or seconds - before < MIN_REGRESSION_SECONDS:
+                continue
+            if seconds > before * tolerance:
+                regressions.append(f"{size} rows / {stage}: {before * 1000:.1f} ms -> {seconds * 1000:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analytics data pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="ledger sizes in rows")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the fastest is kept")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the JSON results")
+    parser.add_argument("--compare", help="baseline JSON to check the results against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="slowdown factor counted as a regression")
+    parser.add_argument("--apply-baseline", action="store_true",
+                        help="also time the old per-row .apply derivation of the derived columns")
+    args = parser.parse_args()
+
+    _stub_streamlit()
+    # Warm-up pass so lazy imports and first-call setup don't land in the smallest size
+    run_pipeline(200, 1)
+    results = {}
+    for size in args.sizes:
+        print(f"{size:,} rows")
+        results[str(size)] = run_pipeline(size, args.repeat, args.apply_baseline)
+        for stage, seconds in results[str(size)].items():
+            print(f"  {stage:<24} {seconds * 1000:10.2f} ms")
+
+    # Read the baseline first: --output may point at the same file
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No stage slower than {args.tolerance}x the baseline")
+
+if __name__ == "__main__":
+    main()
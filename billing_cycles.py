@@ -0,0 +1,55 @@
+"""Vectorized billing-cycle assignment over whole date columns.
+
+A cycle is identified by an integer period id, year * 12 + (month - 1) of the
+month it closes in (see expense_schema.billing_cycle_id), so cycles sort,
+compare and group as plain integers. Rows paid with anything that isn't a
+card in BILLING_CARDS get NO_CYCLE.
+"""
+import numpy as np
+import pandas as pd
+
+from expense_schema import BILLING_CARDS, billing_cycle_stamp
+
+NO_CYCLE = -1
+
+
+def _card_masks(payment_methods, cards):
+    methods = payment_methods if isinstance(payment_methods, pd.Series) else pd.Series(payment_methods, dtype=object)
+    for method, card in cards.items():
+        yield card, (methods == method).to_numpy()
+
+
+def billing_cycle_ids(dates, payment_methods, cards=BILLING_CARDS):
+    """Cycle id for every row, each card using its own statement day; NO_CYCLE for non-card rows"""
+    dates = pd.DatetimeIndex(dates)
+    ids = np.full(len(dates), NO_CYCLE, dtype=np.int64)
+    month_ids = dates.year.to_numpy() * 12 + dates.month.to_numpy() - 1
+    day = dates.day.to_numpy()
+    for card, mask in _card_masks(payment_methods, cards):
+        mask = mask & ~dates.isna()
+        ids[mask] = month_ids[mask] + (day[mask] > card["statement_day"])
+    return ids
+
+
+def billing_cycle_labels(dates, payment_methods, cards=BILLING_CARDS):
+    """billingCycle stamps ("Feb 25 - Mar 25") for every row, "" for non-card rows.
+
+    Each distinct cycle is formatted once and broadcast back to its rows.
+    """
+    ids = billing_cycle_ids(dates, payment_methods, cards)
+    labels = np.full(len(ids), "", dtype=object)
+    for card, mask in _card_masks(payment_methods, cards):
+        mask = mask & (ids != NO_CYCLE)
+        unique_ids, positions = np.unique(ids[mask], return_inverse=True)
+        names = np.array([billing_cycle_stamp(cycle_id, card["stamp_day"]) for cycle_id in unique_ids], dtype=object)
+        labels[mask] = names[positions]
+    return labels
+
+
+def cycle_bounds(ids, statement_day):
+    """(first day, last day) of each cycle id as datetime64[D] arrays"""
+    ids = np.asarray(ids, dtype=np.int64)
+    month_starts = (ids - 1970 * 12).astype('datetime64[M]')
+    end = month_starts.astype('datetime64[D]') + (statement_day - 1)
+    start = (month_starts - 1).astype('datetime64[D]') + statement_day
+    return start, end
@@ -0,0 +1,275 @@
+import os
+import threading
+import time
+import logging
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # Snapshots are skipped when pyarrow is not installed
+    pa = None
+    feather = None
+
+logger = logging.getLogger(__name__)
+
+# Default lifetime (seconds) of a cached dataset before it is revalidated
+DEFAULT_TTL_SECONDS = 300
+
+# Bumped whenever the cleaned frame gains or changes columns; older snapshots are ignored
+SNAPSHOT_SCHEMA = "2"
+
+# Columns that identify a submission, used to drop duplicates at the sync cursor
+DEDUPE_COLUMNS = ['timeStamp', 'expenseName', 'category', 'paymentMethod', 'date']
+
+
+class ExpenseCache:
+    """In-process store for the cleaned expense DataFrame, shared by every Streamlit session.
+
+    Entries carry the version token reported by the Apps Script, so an expired
+    entry can be revalidated cheaply instead of downloading the sheet again.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS):
+        self.ttl = ttl
+        # Guards the cached state; only ever held briefly, never across network calls
+        self.lock = threading.RLock()
+        # Held while fetching so concurrent sessions (and the background refresher) share a single download
+        self.fetch_lock = threading.Lock()
+        # Serializes snapshot writes, which run outside self.lock so readers never wait on the disk
+        self.snapshot_lock = threading.Lock()
+        self.frame = None
+        self.version = None
+        self.fetched_at = 0.0
+        # Wall-clock time the data was last confirmed against the store, for "updated ... ago"
+        self.synced_at = None
+        # Highest timeStamp seen, used as the "since" cursor for delta syncs
+        self.max_timestamp = None
+        self.snapshot_path = None
+        self.restored = False
+        # Values computed from the current frame (e.g. aggregates), dropped when it changes
+        self.derived = {}
+        # Results of filtered server-side queries: key -> (value, fetched_at)
+        self.queries = {}
+        # (store, query feature) pairs the store was seen to ignore, so they are probed only once
+        self.unsupported = set()
+        self.hits = 0
+        self.misses = 0
+        self.delta_syncs = 0
+
+    def is_fresh(self):
+        """True when cached data exists and is younger than the TTL"""
+        return self.frame is not None and (time.monotonic() - self.fetched_at) < self.ttl
+
+    def age(self):
+        """Seconds since the cached data was last fetched or revalidated"""
+        if self.frame is None:
+            return None
+        return time.monotonic() - self.fetched_at
+
+    def synced_age(self):
+        """Seconds since the data was last confirmed against the store; unlike age(), not reset by invalidate()"""
+        if self.frame is None or self.synced_at is None:
+            return None
+        return max(0.0, time.time() - self.synced_at)
+
+    def store(self, frame, version=None):
+        """Replace the cached dataset and restart its TTL"""
+        with self.lock:
+            self.frame = frame
+            self.derived = {}
+            self.version = version
+            self.fetched_at = time.monotonic()
+            self.synced_at = time.time()
+            self.max_timestamp = latest_timestamp(frame)
+            logger.debug(f"Cached {len(frame)} expense rows (version={version})")
+        self.save_snapshot()
+
+    def merge(self, frame, version=None):
+        """Append rows from a delta sync, skipping ones already held.
+
+        The "since" cursor is inclusive so expenses submitted within the same
+        second are not lost; rows at the cursor that we already have are dropped.
+        """
+        with self.lock:
+            if self.max_timestamp is not None and not frame.empty:
+                at_cursor = self.frame[self.frame['timeStamp'].astype(str) == self.max_timestamp]
+                subset = [column for column in DEDUPE_COLUMNS
+                          if column in frame.columns and column in at_cursor.columns]
+                if not at_cursor.empty and subset:
+                    known = pd.MultiIndex.from_frame(at_cursor[subset].astype(str))
+                    incoming = pd.MultiIndex.from_frame(frame[subset].astype(str))
+                    frame = frame[~incoming.isin(known)]
+
+            if not frame.empty:
+                # New object so readers holding the previous frame never see it change
+                merged = pd.concat([self.frame, frame], ignore_index=True)
+                # concat falls back to object when the category sets differ; keep the
+                # held categories in their order and append the delta's new values
+                for column in self.frame.columns[self.frame.dtypes == 'category']:
+                    if merged[column].dtype != 'category':
+                        held = list(self.frame[column].cat.categories)
+                        new = set(pd.unique(frame[column].dropna())) - set(held)
+                        merged[column] = pd.Categorical(merged[column], categories=held + sorted(new, key=str))
+                self.frame = merged
+                self.derived = {}
+                stamps = [stamp for stamp in (self.max_timestamp, latest_timestamp(frame)) if stamp]
+                self.max_timestamp = max(stamps) if stamps else None
+            self.version = version
+            self.fetched_at = time.monotonic()
+            self.synced_at = time.time()
+            self.delta_syncs += 1
+            logger.debug(f"Merged {len(frame)} new expense rows (version={version})")
+        if not frame.empty:
+            self.save_snapshot()
+        return frame
+
+    def supports(self, source, feature):
+        """False once `source` answered a `feature` query (e.g. "since") with the full data"""
+        with self.lock:
+            return (source, feature) not in self.unsupported
+
+    def mark_unsupported(self, source, feature):
+        """Remember that `source` ignores `feature`, so later syncs skip the probe"""
+        with self.lock:
+            if (source, feature) not in self.unsupported:
+                logger.info(f"{source} does not support {feature!r} queries; using full downloads")
+                self.unsupported.add((source, feature))
+
+    def touch(self):
+        """Restart the TTL after the server confirmed the data is unchanged"""
+        with self.lock:
+            self.fetched_at = time.monotonic()
+            self.synced_at = time.time()
+
+    def invalidate(self):
+        """Force the next read to revalidate, keeping the data as a fallback"""
+        with self.lock:
+            self.fetched_at = 0.0
+            self.queries = {}
+
+    def clear(self):
+        """Drop the cached dataset entirely"""
+        with self.lock:
+            self.frame = None
+            self.derived = {}
+            self.version = None
+            self.fetched_at = 0.0
+            self.synced_at = None
+            self.max_timestamp = None
+            self.queries = {}
+
+    def get_query(self, key):
+        """Cached result of a filtered query, or None if missing or older than the TTL"""
+        with self.lock:
+            entry = self.queries.get(key)
+            if entry is None or (time.monotonic() - entry[1]) >= self.ttl:
+                return None
+            return entry[0]
+
+    def store_query(self, key, value):
+        with self.lock:
+            self.queries[key] = (value, time.monotonic())
+
+    def derive(self, frame, key, builder):
+        """Memoize builder() for `frame` while it is the cached frame; recomputed after the data changes.
+
+        builder runs outside the lock, so readers of the cache never wait for it.
+        """
+        with self.lock:
+            current = self.frame is frame
+            if current and key in self.derived:
+                return self.derived[key]
+        value = builder()
+        if current:
+            with self.lock:
+                # Dropped if the frame was replaced meanwhile
+                if self.frame is frame:
+                    value = self.derived.setdefault(key, value)
+        return value
+
+    def save_snapshot(self):
+        """Persist the cleaned frame as a Feather (Arrow IPC) file along with its sync state.
+
+        Called without self.lock held: the state is read under the lock, then
+        written while readers carry on with the cache.
+        """
+        with self.lock:
+            frame, version, max_timestamp = self.frame, self.version, self.max_timestamp
+        if feather is None or self.snapshot_path is None or frame is None:
+            return
+        with self.snapshot_lock:
+            # A newer frame was stored meanwhile; its own save writes it, so don't overwrite with this one
+            if self.frame is not frame:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+                table = pa.Table.from_pandas(_arrow_safe(frame), preserve_index=False)
+                table = table.replace_schema_metadata({
+                    **(table.schema.metadata or {}),
+                    b'expense_version': str(version or '').encode(),
+                    b'expense_max_timestamp': str(max_timestamp or '').encode(),
+                    b'expense_schema': SNAPSHOT_SCHEMA.encode(),
+                })
+                # Write then rename so a crash never leaves a half-written snapshot
+                temp_path = f"{self.snapshot_path}.tmp"
+                feather.write_feather(table, temp_path)
+                os.replace(temp_path, self.snapshot_path)
+            except Exception as e:
+                logger.warning(f"Could not write expense snapshot: {str(e)}")
+
+    def restore_snapshot(self):
+        """Load the last snapshot into an empty cache; only tried once per process.
+
+        A server restart renders the dashboard from the restored snapshot, but it
+        starts out expired: expenses acknowledged since it was written (e.g.
+        before analytics was loaded) are missing from it, so the first read
+        revalidates it with a delta sync.
+        """
+        with self.lock:
+            if self.restored or self.frame is not None:
+                return False
+            self.restored = True
+            if feather is None or self.snapshot_path is None or not os.path.exists(self.snapshot_path):
+                return False
+            try:
+                table = feather.read_table(self.snapshot_path, memory_map=True)
+            except Exception as e:
+                logger.warning(f"Could not read expense snapshot: {str(e)}")
+                return False
+            metadata = table.schema.metadata or {}
+            if metadata.get(b'expense_schema', b'').decode() != SNAPSHOT_SCHEMA:
+                logger.info(f"Ignoring expense snapshot written with an older layout: {self.snapshot_path}")
+                return False
+            self.frame = table.to_pandas()
+            self.derived = {}
+            self.version = metadata.get(b'expense_version', b'').decode() or None
+            self.max_timestamp = metadata.get(b'expense_max_timestamp', b'').decode() or None
+            self.fetched_at = 0.0
+            # Written whenever a sync changed the data, so its mtime is at worst older than the last sync
+            self.synced_at = os.path.getmtime(self.snapshot_path)
+            logger.debug(f"Restored {len(self.frame)} expense rows from {self.snapshot_path}")
+            return True
+
+
+def latest_timestamp(frame):
+    """Highest timeStamp in the frame; "%Y-%m-%d %H:%M:%S" strings sort chronologically"""
+    if 'timeStamp' not in frame.columns:
+        return None
+    stamps = frame['timeStamp'].dropna().astype(str)
+    stamps = stamps[stamps != '']
+    return stamps.max() if not stamps.empty else None
+
+
+def _arrow_safe(frame):
+    """Stringify object columns so sheet cells mixing numbers and blanks serialize"""
+    frame = frame.copy()
+    for column in frame.columns[frame.dtypes == object]:
+        values = frame[column]
+        frame[column] = values.where(values.isna(), values.astype(str))
+    return frame
+
+
+# Shared across sessions: Streamlit re-runs scripts but keeps imported modules
+shared_cache = ExpenseCache()
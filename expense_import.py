@@ -0,0 +1,184 @@
+import streamlit as st
+import pandas as pd
+from datetime import datetime
+import logging
+
+from expense_store import get_backend
+from expense_schema import CATEGORIES, PAYMENT_METHODS
+from billing_cycles import billing_cycle_labels
+
+logger = logging.getLogger(__name__)
+
+# Accepted spellings of each column (case-insensitive), covering common bank and card statement exports
+COLUMN_ALIASES = {
+    'date': ['date', 'transaction date', 'txn date', 'value date', 'posting date'],
+    'expenseName': ['expensename', 'expense name', 'expense', 'name', 'description', 'narration',
+                    'details', 'particulars', 'merchant'],
+    'category': ['category'],
+    'paymentMethod': ['paymentmethod', 'payment method', 'method'],
+    'amount': ['amount', 'debit', 'debit amount', 'withdrawal', 'withdrawal amount', 'withdrawal amt.'],
+    'shared': ['shared'],
+    'splitBetween': ['splitbetween', 'split between'],
+    'splitAmount': ['splitamount', 'split amount'],
+}
+
+# Rows sent per batch to the expense store (one POST when it is the Apps Script)
+BATCH_SIZE = 200
+
+# People a shared row is split between when the file doesn't say (same default as the expense form)
+DEFAULT_SPLIT_BETWEEN = 2
+
+
+def parse_expense_csv(file, default_category="Miscellaneous", default_payment_method="Credit card", dayfirst=False):
+    """Validate an expense CSV or statement export.
+
+    Returns (records, errors): records are ready-to-submit dicts in the same
+    shape as the expense form produces, errors a DataFrame of rejected rows.
+    Missing category/paymentMethod columns or blank cells take the defaults.
+    """
+    raw = pd.read_csv(file, dtype=str, keep_default_na=False)
+    columns = {column.strip().lower(): column for column in raw.columns}
+    df = pd.DataFrame(index=raw.index)
+    for field, aliases in COLUMN_ALIASES.items():
+        source = next((columns[alias] for alias in aliases if alias in columns), None)
+        df[field] = raw[source].str.strip() if source is not None else ""
+
+    df['category'] = df['category'].where(df['category'] != "", default_category)
+    df['paymentMethod'] = df['paymentMethod'].where(df['paymentMethod'] != "", default_payment_method)
+    # ISO dates (2024-03-05) are unambiguous and parsed strictly; dayfirst only
+    # decides how the other rows (05/03/2024) are read
+    dates = pd.to_datetime(df['date'], errors='coerce', format='ISO8601')
+    other = dates.isna() & (df['date'] != "")
+    if other.any():
+        dates[other] = pd.to_datetime(df['date'][other], errors='coerce', dayfirst=dayfirst, format='mixed')
+    amounts = pd.to_numeric(df['amount'].str.replace(r'[₹,\s]', '', regex=True), errors='coerce')
+
+    # Same checks as the expense form, evaluated for all rows at once
+    problems = {
+        "missing expense name": df['expenseName'] == "",
+        "invalid date": dates.isna(),
+        "amount must be greater than 0": ~(amounts > 0),
+        "unknown category": ~df['category'].isin(CATEGORIES),
+        "unknown payment method": ~df['paymentMethod'].isin(PAYMENT_METHODS),
+    }
+    messages = pd.Series("", index=df.index)
+    for message, mask in problems.items():
+        messages = messages.where(~mask, messages + "; " + message)
+    invalid = messages != ""
+    errors = raw[invalid].assign(error=messages[invalid].str[2:])
+    errors.index = errors.index + 2  # CSV line numbers (header is line 1)
+
+    valid = df[~invalid]
+    dates = dates[~invalid]
+    amounts = amounts[~invalid]
+    shared = valid['shared'].str.lower().isin(['yes', 'y', 'true', '1'])
+    split_between = pd.to_numeric(valid['splitBetween'], errors='coerce')
+    split_between = split_between.where(split_between >= 1, DEFAULT_SPLIT_BETWEEN)
+    # Like the expense form, a shared row without a split amount costs an equal share
+    split_amounts = pd.to_numeric(valid['splitAmount'], errors='coerce')
+    split_amounts = split_amounts.where(split_amounts > 0, amounts / split_between)
+
+    records = pd.DataFrame({
+        "expenseName": valid['expenseName'],
+        "category": valid['category'],
+        "amount": amounts.where(~shared, split_amounts),
+        "originalAmount": amounts,
+        "date": dates.dt.strftime("%Y-%m-%d"),
+        "month": dates.dt.strftime("%B"),
+        "year": dates.dt.year,
+        "paymentMethod": valid['paymentMethod'],
+        "shared": shared.map({True: "Yes", False: "No"}),
+        "billingCycle": billing_cycle_labels(dates, valid['paymentMethod']),
+        "timeStamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    records.loc[shared, 'splitBetween'] = split_between[shared]
+    records.loc[shared, 'splitAmount'] = records['amount'][shared]
+
+    # Deterministic keys: re-importing the same file is deduped by the script
+    identity = records[['date', 'expenseName', 'category', 'paymentMethod', 'originalAmount']].astype(str)
+    identity['occurrence'] = identity.groupby(list(identity.columns)).cumcount()
+    # astype(str): with no valid rows the mapped hashes stay an (empty) integer column
+    records['idempotencyKey'] = "import-" + pd.util.hash_pandas_object(identity, index=False).map(
+        '{:016x}'.format).astype(str)
+
+    records = records.astype(object).where(records.notna(), None)
+    rows = [{key: value for key, value in row.items() if value is not None}
+            for row in records.to_dict('records')]
+    return rows, errors
+
+
+def import_expenses(records, progress=None):
+    """Send records to the expense store in BATCH_SIZE chunks; returns a summary dict.
+
+    A chunk only counts as stored when the reply says how many rows were
+    inserted: a script deployed before batch imports still answers "success"
+    to {"action": "batch"} without storing the rows.
+    """
+    summary = {"inserted": 0, "duplicates": 0, "failed": 0, "errors": []}
+    backend = get_backend()
+    chunks = [records[i:i + BATCH_SIZE] for i in range(0, len(records), BATCH_SIZE)]
+    for number, chunk in enumerate(chunks, start=1):
+        reply = backend.submit_batch(chunk)
+        inserted = reply.get("inserted")
+        if reply.get("status") == "success" and isinstance(inserted, int) and not isinstance(inserted, bool):
+            summary["inserted"] += inserted
+            summary["duplicates"] += reply.get("duplicates", 0)
+        elif reply.get("status") == "success":
+            summary["failed"] += len(chunk)
+            summary["errors"].append(
+                f"Batch {number}: {backend.label} acknowledged the rows without an inserted count. "
+                f"Its deployed version predates batch imports (action: batch), so the rows may not be stored; "
+                f"redeploy the script with batch support and import again."
+            )
+            logger.warning(f"Import batch {number}: success reply without an inserted count: {reply}")
+        else:
+            summary["failed"] += len(chunk)
+            summary["errors"].append(f"Batch {number}: {reply.get('message', 'Unknown error')}")
+            logger.warning(f"Import batch {number} failed: {reply.get('message')}")
+        if progress is not None:
+            progress(number / len(chunks))
+    return summary
+
+
+def show_import(on_imported=None):
+    """Bulk import page: upload, validate and batch-submit a CSV of expenses"""
+    st.title("📥 Bulk Import")
+    st.caption("Import a CSV of expenses or a bank / credit-card statement export")
+
+    uploaded = st.file_uploader("CSV file", type=["csv"])
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        default_category = st.selectbox("Category for rows without one", CATEGORIES)
+    with col2:
+        default_payment_method = st.selectbox("Payment method for rows without one", PAYMENT_METHODS,
+                                              index=PAYMENT_METHODS.index("Credit card"))
+    with col3:
+        dayfirst = st.checkbox("Dates are day-first (DD/MM/YYYY)", value=True)
+
+    if uploaded is None:
+        st.info("Expected columns: date, expenseName (or description/narration), amount (or debit), "
+                "and optionally category, paymentMethod, shared, splitBetween, splitAmount")
+        return
+
+    try:
+        records, errors = parse_expense_csv(uploaded, default_category, default_payment_method, dayfirst)
+    except Exception as e:
+        st.error(f"Could not read the file: {str(e)}")
+        return
+
+    st.write(f"✅ {len(records)} valid rows, ❌ {len(errors)} rejected")
+    if records:
+        st.dataframe(pd.DataFrame(records).head(20), use_container_width=True)
+    if not errors.empty:
+        with st.expander("Rejected rows", expanded=False):
+            st.dataframe(errors, use_container_width=True)
+
+    if records and st.button(f"Import {len(records)} expenses", use_container_width=True):
+        progress_bar = st.progress(0.0)
+        summary = import_expenses(records, progress=progress_bar.progress)
+        if summary["inserted"] and on_imported is not None:
+            on_imported()
+        st.success(f"Imported {summary['inserted']} expenses ({summary['duplicates']} already present)")
+        for error in summary["errors"]:
+            st.error(error)
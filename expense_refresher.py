@@ -0,0 +1,127 @@
+"""Stale-while-revalidate refresh of the shared expense dataset.
+
+One daemon thread per server process re-syncs the cached expenses with the
+store every REFRESH_SECONDS, and right away when woken (e.g. after a
+submission was acknowledged). A scheduled pass is skipped when no session
+has read the data since the previous one, so an idle server doesn't poll
+the Apps Script all day. While it runs, readers never download the full
+data: they get whatever dataset is ready, however old, plus its age, so no
+page render waits on the Apps Script.
+
+The refresh itself is passed in (analytics.background_refresh), so this
+module stays light enough for main.py to import at startup.
+"""
+import os
+import threading
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = int(os.environ.get("EXPENSE_REFRESH_SECONDS", 120))
+# Wait before retrying a failed refresh
+RETRY_SECONDS = 30
+
+
+class ExpenseRefresher:
+    """Runs refresh() on a schedule and on demand, on a single background thread"""
+
+    def __init__(self, interval=REFRESH_SECONDS, retry=RETRY_SECONDS):
+        self.interval = interval
+        self.retry = retry
+        self.refresh = None
+        self.lock = threading.Lock()
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._thread = None
+        self.busy = False
+        # Set by readers; the first pass always runs
+        self._read = True
+        self.refreshes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error = None
+        # The exception of the last failed pass, e.g. for showing setup instructions
+        self.last_exception = None
+        self.last_finished = None
+        self.durations = deque(maxlen=50)
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, refresh):
+        """Start the thread once; refresh() syncs the dataset and raises on failure"""
+        with self.lock:
+            if self._thread is None:
+                self.refresh = refresh
+                self._thread = threading.Thread(target=self._run, name="expense-refresher", daemon=True)
+                self._thread.start()
+
+    def wake(self):
+        """Refresh now instead of at the next scheduled time"""
+        self._wake.set()
+
+    def mark_read(self):
+        """Note that a session used the data, so the next scheduled pass runs"""
+        self._read = True
+
+    def wait_ready(self, timeout=None):
+        """Block until the first refresh has finished (successfully or not); for scripts and tests"""
+        return self._ready.wait(timeout)
+
+    def stats(self):
+        durations = list(self.durations)
+        return {
+            "running": self.running,
+            "busy": self.busy,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_error": self.last_error,
+            "last_refresh_ms": round(durations[-1] * 1000, 1) if durations else None,
+            "avg_refresh_ms": round(sum(durations) / len(durations) * 1000, 1) if durations else None,
+            "interval_seconds": self.interval,
+        }
+
+    def _run(self):
+        woken = False
+        while True:
+            self._wake.clear()
+            if woken or self._read:
+                self._read = False
+                delay = self._refresh_once()
+            else:
+                # Nobody looked at the data since the last pass, so don't poll the store for it
+                self.skipped += 1
+                delay = self.interval
+            # Sleep until the next scheduled refresh, or until woken
+            woken = self._wake.wait(timeout=delay)
+
+    def _refresh_once(self):
+        """Run refresh() once; returns the delay before the next scheduled pass"""
+        self.busy = True
+        started = time.perf_counter()
+        try:
+            self.refresh()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            self.last_exception = e
+            logger.warning(f"Background expense refresh failed: {str(e)}")
+            return min(self.retry, self.interval)
+        else:
+            self.refreshes += 1
+            self.last_error = None
+            self.last_exception = None
+            self.durations.append(time.perf_counter() - started)
+            return self.interval
+        finally:
+            self.busy = False
+            self.last_finished = time.time()
+            self._ready.set()
+
+
+# Shared by every session of this server process
+shared_refresher = ExpenseRefresher()
@@ -0,0 +1,51 @@
+import calendar
+from datetime import date, timedelta
+
+# Categories offered by the expense form and accepted by the bulk import
+CATEGORIES = [
+    "Miscellaneous", "Bike", "Auto/Cab", "Public transport", "Groceries", "Eating out", 
+    "Party", "Household supplies", "Education", "Gift", "Cinema", "Entertainment", 
+    "Rent/Maintenance", "Furniture", "Services", "Electricity", "Internet", "Investment", 
+    "Insurance", "Medical expenses", "Flights", "Travel", "Clothes", "Gas", "Phone"
+]
+
+PAYMENT_METHODS = ["Cred UPI", "Credit card", "GPay UPI", "Pine Perks", "Cash", "Debit card", "Net Banking"]
+
+# Card payment methods and their billing cycle settings. A purchase made up to and
+# including statement_day falls in the cycle that closes that month, a later one in
+# the next month's cycle, so a cycle runs from the day after one statement to the next.
+# stamp_day is the day in the billingCycle text stored with each expense ("Feb 25 - Mar 25"),
+# kept as the sheet has always recorded it; the dashboard labels cycles by their bounds.
+BILLING_CARDS = {
+    "Credit card": {"statement_day": 15, "stamp_day": 25},
+}
+
+def billing_cycle_id(date_obj, statement_day):
+    """Integer period id of a date's billing cycle: year * 12 + (month - 1) of its closing month"""
+    return date_obj.year * 12 + date_obj.month - 1 + (date_obj.day > statement_day)
+
+def billing_cycle_bounds(cycle_id, statement_day):
+    """(first day, last day) of a billing cycle as dates; billing_cycles.cycle_bounds for whole arrays"""
+    start_year, start_month = divmod(cycle_id - 1, 12)
+    end_year, end_month = divmod(cycle_id, 12)
+    start = date(start_year, start_month + 1, 1) + timedelta(days=statement_day)
+    end = date(end_year, end_month + 1, 1) + timedelta(days=statement_day - 1)
+    return start, end
+
+def billing_cycle_label(cycle_id, statement_day):
+    """Display label of a billing cycle, e.g. "Mar 16 - Apr 15" """
+    start, end = billing_cycle_bounds(cycle_id, statement_day)
+    return f"{calendar.month_abbr[start.month]} {start.day} - {calendar.month_abbr[end.month]} {end.day}"
+
+def billing_cycle_stamp(cycle_id, stamp_day):
+    """billingCycle text stored with an expense, e.g. "Feb 25 - Mar 25" for the cycle closing in March"""
+    end_month = cycle_id % 12 + 1
+    start_month = (cycle_id - 1) % 12 + 1
+    return f"{calendar.month_abbr[start_month]} {stamp_day} - {calendar.month_abbr[end_month]} {stamp_day}"
+
+# Function to get billing cycle
+def get_billing_cycle(date_obj, payment_method="Credit card"):
+    card = BILLING_CARDS.get(payment_method)
+    if card is None:
+        return ""
+    return billing_cycle_stamp(billing_cycle_id(date_obj, card["statement_day"]), card["stamp_day"])
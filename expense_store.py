@@ -0,0 +1,378 @@
+"""Pluggable storage for expenses: the Google Apps Script web app or a local SQLite file.
+
+EXPENSE_BACKEND picks the store for the whole server process:
+
+    apps_script (default)  every read and write goes to the Apps Script web app
+    sqlite                 an embedded database at EXPENSE_DB_PATH; reads and writes
+                           take milliseconds and never leave the machine
+
+Both backends answer the same query contract as the script (see
+stand_in_server.py: version, periods, since, filtered slices with a cursor,
+the columnar feed), so analytics' cache, delta syncs and slices work
+unchanged. The SQLite store additionally aggregates the dashboard cube in
+SQL (aggregate_cube) instead of shipping the rows.
+
+With EXPENSE_MIRROR_TO_APPS_SCRIPT=1 every row written to the local store
+is also queued for the script on the durable submission queue, so the sheet
+keeps an asynchronous copy. Seed an empty local store from the sheet with
+
+    python expense_store.py --seed-from-apps-script
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import uuid
+import logging
+from abc import ABC, abstractmethod
+
+import apps_script_client
+from expense_schema import BILLING_CARDS
+from perf_trace import span
+
+logger = logging.getLogger(__name__)
+
+BACKEND = os.environ.get("EXPENSE_BACKEND", "apps_script")
+
+DB_PATH = os.environ.get(
+    "EXPENSE_DB_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".expense_cache", "expenses.sqlite")
+)
+
+MIRROR_TO_APPS_SCRIPT = os.environ.get("EXPENSE_MIRROR_TO_APPS_SCRIPT", "").lower() in ("1", "true", "yes")
+
+# Columns of the expenses table, in the order the expense form fills them
+EXPENSE_COLUMNS = ['expenseName', 'category', 'amount', 'originalAmount', 'date', 'month', 'year',
+                   'paymentMethod', 'shared', 'billingCycle', 'timeStamp', 'splitBetween', 'splitAmount',
+                   'idempotencyKey']
+
+_DATE_POSITION = EXPENSE_COLUMNS.index('date')
+
+# Query parameters that filter a read down to a slice; the stand-in script imports these
+FILTER_PARAMS = ['year', 'month', 'category', 'paymentMethod', 'from', 'to']
+
+# Rows per page when a sliced read doesn't pass a limit
+DEFAULT_PAGE_SIZE = 500
+
+
+class ExpenseStoreError(Exception):
+    """The store answered a read with an error instead of data"""
+
+
+class ExpenseBackend(ABC):
+    """Where expenses are read from and written to.
+
+    query(params) answers the script's GET contract with a reply dict and
+    submit/submit_batch its POST contract; submissions never raise.
+    """
+
+    name = ""
+    label = ""
+    # Identifies the store (script URL or database file), e.g. to remember which queries it supports
+    source = ""
+    # True when reads and writes are local and cheap enough to do inline
+    local = False
+
+    @abstractmethod
+    def query(self, params):
+        pass
+
+    @abstractmethod
+    def submit(self, data):
+        pass
+
+    @abstractmethod
+    def submit_batch(self, rows):
+        pass
+
+    def aggregate_cube(self, filters):
+        """Cube cells for the filters aggregated by the store, or None if it can't aggregate"""
+        return None
+
+
+class AppsScriptBackend(ExpenseBackend):
+    """The Google Apps Script web app, over HTTP"""
+
+    name = "apps_script"
+    label = "Google Apps Script"
+
+    @property
+    def source(self):
+        return apps_script_client.SCRIPT_URL
+
+    def query(self, params):
+        """The script's JSON reply; raises json.JSONDecodeError (doc = the page) for a non-JSON answer.
+
+        Raises ExpenseStoreError for a non-200 response or an error reply, so an
+        outage is never mistaken for an empty sheet.
+        """
+        response = apps_script_client.get(params=params)
+        if response.status_code != 200:
+            raise ExpenseStoreError(f"HTTP Status: {response.status_code}")
+        with span("decode_json"):
+            payload = response.json()
+        if isinstance(payload, dict) and payload.get('status') == 'error':
+            raise ExpenseStoreError(payload.get('message') or "The script answered with an error")
+        return payload
+
+    def submit(self, data):
+        return apps_script_client.submit_json(data)
+
+    def submit_batch(self, rows):
+        return apps_script_client.submit_batch(rows)
+
+
+class SQLiteBackend(ExpenseBackend):
+    """Expenses in an embedded SQLite database, indexed on date, category and paymentMethod.
+
+    The integer rowid keeps insertion order, so it doubles as the slice cursor
+    and as the version token. If `mirror` is set it is
+    called with every accepted payload (e.g. SubmissionQueue.enqueue).
+    """
+
+    name = "sqlite"
+    label = "SQLite"
+    local = True
+
+    def __init__(self, path, mirror=None):
+        self.path = path
+        self.source = path
+        self.mirror = mirror
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # One connection under self.lock serves every session, so reads and writes never overlap
+        # here; WAL with synchronous=NORMAL keeps each commit cheap and lets other processes
+        # (e.g. this module's CLI) read the file while a submission is written
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS expenses (
+                    id INTEGER PRIMARY KEY,
+                    expenseName TEXT,
+                    category TEXT,
+                    amount REAL NOT NULL,
+                    originalAmount REAL,
+                    date TEXT NOT NULL,
+                    month TEXT,
+                    year INTEGER,
+                    paymentMethod TEXT,
+                    shared TEXT,
+                    billingCycle TEXT,
+                    timeStamp TEXT,
+                    splitBetween INTEGER,
+                    splitAmount REAL,
+                    idempotencyKey TEXT UNIQUE
+                )
+            """)
+            # date is an ISO string, so year/month/from/to filters are index range scans
+            self.connection.execute("CREATE INDEX IF NOT EXISTS expenses_date ON expenses (date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS expenses_category ON expenses (category, date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS expenses_payment ON expenses (paymentMethod, date)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS expenses_time ON expenses (timeStamp)")
+
+    def _version(self):
+        # Rows are only ever appended, so the newest rowid changes with every write
+        return str(self.connection.execute("SELECT MAX(id) FROM expenses").fetchone()[0] or 0)
+
+    def query(self, params):
+        with span("sqlite.query") as record, self.lock:
+            if params.get('action') == 'version':
+                return {"status": "success", "version": self._version()}
+            if params.get('action') == 'periods':
+                periods = self.connection.execute("""
+                    SELECT CAST(substr(date, 1, 4) AS INTEGER), CAST(substr(date, 6, 2) AS INTEGER), COUNT(*)
+                    FROM expenses GROUP BY substr(date, 1, 7) ORDER BY 1, 2
+                """).fetchall()
+                return {"status": "success", "version": self._version(),
+                        "periods": [{"year": year, "month": month, "count": count} for year, month, count in periods]}
+
+            filters = {key: str(params[key]) for key in FILTER_PARAMS if key in params}
+            reply = {"status": "success", "version": self._version()}
+            if filters or 'cursor' in params:
+                where, arguments = _where(filters)
+                cursor = int(params.get('cursor') or 0)
+                limit = int(params.get('limit') or DEFAULT_PAGE_SIZE)
+                # One extra row tells whether another page follows
+                rows = self._select(f"{where} AND id > ? ORDER BY id LIMIT ?", arguments + [cursor, limit + 1])
+                more = len(rows) > limit
+                rows = rows[:limit]
+                reply.update(filters=filters, nextCursor=str(rows[-1][0]) if more else None)
+            elif 'since' in params:
+                rows = self._select("WHERE timeStamp >= ? ORDER BY id", [params['since']])
+                reply["since"] = params['since']
+                reply["total"] = self.connection.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+            else:
+                rows = self._select("ORDER BY id", [])
+            record["rows"] = len(rows)
+        reply.update(_encode(rows, params.get('format')))
+        return reply
+
+    def _select(self, clause, arguments):
+        # Caller holds self.lock
+        return self.connection.execute(
+            f"SELECT id, {', '.join(EXPENSE_COLUMNS)} FROM expenses {clause}", arguments
+        ).fetchall()
+
+    def aggregate_cube(self, filters):
+        """Sum/count/date span per (year, month, week, category, paymentMethod, billing_cycle) cell.
+
+        week is the day-of-month bucket 0-4 (days 1-7 ... 29+); billing_cycle is
+        computed like billing_cycles.billing_cycle_ids, -1 for non-card rows.
+        """
+        import pandas as pd
+
+        where, arguments = _where({key: str(value) for key, value in filters.items()})
+        cycle = ("CASE paymentMethod " + " ".join(
+            "WHEN ? THEN CAST(substr(date, 1, 4) AS INTEGER) * 12 + CAST(substr(date, 6, 2) AS INTEGER) - 1"
+            " + (CAST(substr(date, 9, 2) AS INTEGER) > ?)" for _ in BILLING_CARDS
+        ) + " ELSE -1 END") if BILLING_CARDS else "-1"
+        cycle_arguments = [value for method, card in BILLING_CARDS.items() for value in (method, card["statement_day"])]
+        with span("sqlite.aggregate_cube") as record, self.lock:
+            cells = self.connection.execute(f"""
+                SELECT CAST(substr(date, 1, 4) AS INTEGER) AS year,
+                       CAST(substr(date, 6, 2) AS INTEGER) AS month,
+                       MIN((CAST(substr(date, 9, 2) AS INTEGER) - 1) / 7, 4) AS week,
+                       category, paymentMethod, {cycle} AS billing_cycle,
+                       SUM(amount), COUNT(*), MIN(date), MAX(date)
+                FROM expenses {where}
+                GROUP BY 1, 2, 3, 4, 5, 6
+            """, cycle_arguments + arguments).fetchall()
+            record["rows"] = len(cells)
+        return pd.DataFrame(cells, columns=['year', 'month', 'week', 'category', 'paymentMethod', 'billing_cycle',
+                                            'amount', 'count', 'first_date', 'last_date'])
+
+    def submit(self, data):
+        if data.get('test'):
+            return {"status": "success", "message": "Connection OK"}
+        if data.get('action') == 'batch':
+            return self.submit_batch(data.get('rows', []))
+        # The key travels with the mirrored copy, so the script dedupes replays of it
+        data = data if data.get('idempotencyKey') else {**data, "idempotencyKey": uuid.uuid4().hex}
+        reply = self._store([data])
+        if reply["status"] != "success":
+            return reply
+        if not reply["inserted"]:
+            return {"status": "success", "duplicate": True}
+        if self.mirror is not None:
+            self.mirror(data)
+        return {"status": "success"}
+
+    def submit_batch(self, rows):
+        reply = self._store(rows)
+        if reply["status"] == "success" and reply["inserted"] and self.mirror is not None:
+            self.mirror({"action": "batch", "rows": rows})
+        return reply
+
+    def _store(self, rows):
+        """Insert rows, skipping idempotencyKeys already stored; never raises"""
+        values = []
+        for row in rows:
+            if row.get('date') in (None, "") or row.get('amount') in (None, ""):
+                return {"status": "error", "message": "Every expense needs a date and an amount"}
+            value = list(map(row.get, EXPENSE_COLUMNS))
+            # Only the day is kept, so date filters and aggregates can work on the ISO prefix
+            value[_DATE_POSITION] = str(value[_DATE_POSITION])[:10]
+            values.append(value)
+        try:
+            with span("sqlite.insert", rows=len(values)), self.lock, self.connection:
+                before = self.connection.total_changes
+                self.connection.executemany(
+                    f"INSERT OR IGNORE INTO expenses ({', '.join(EXPENSE_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(EXPENSE_COLUMNS))})", values
+                )
+                inserted = self.connection.total_changes - before
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store {len(values)} expense(s) in {self.path}: {str(e)}")
+            return {"status": "error", "message": str(e)}
+        return {"status": "success", "inserted": inserted, "duplicates": len(values) - inserted}
+
+    def count(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM expenses").fetchone()[0]
+
+
+def _where(filters):
+    """SQL WHERE clause and arguments for slice filters (all values as strings)"""
+    clauses = ["1 = 1"]
+    arguments = []
+    if 'year' in filters and 'month' in filters:
+        year, month = int(filters['year']), int(filters['month'])
+        clauses.append("date >= ? AND date < ?")
+        arguments += [f"{year:04d}-{month:02d}-01",
+                      f"{year + month // 12:04d}-{month % 12 + 1:02d}-01"]
+    elif 'year' in filters:
+        clauses.append("date >= ? AND date < ?")
+        arguments += [f"{int(filters['year']):04d}-01-01", f"{int(filters['year']) + 1:04d}-01-01"]
+    elif 'month' in filters:
+        clauses.append("substr(date, 6, 2) = ?")
+        arguments.append(f"{int(filters['month']):02d}")
+    if 'from' in filters:
+        clauses.append("date >= ?")
+        arguments.append(filters['from'])
+    if 'to' in filters:
+        # Inclusive: dates may carry a time part after the day
+        clauses.append("date < ?")
+        arguments.append(filters['to'] + "~")
+    for column in ('category', 'paymentMethod'):
+        if column in filters:
+            clauses.append(f"{column} = ?")
+            arguments.append(filters[column])
+    return "WHERE " + " AND ".join(clauses), arguments
+
+
+def _encode(rows, feed_format):
+    """Reply body for selected (id, *EXPENSE_COLUMNS) rows; columns that are empty throughout are left out"""
+    import expense_feed
+
+    columns = list(zip(*rows))[1:] if rows else [()] * len(EXPENSE_COLUMNS)
+    present = {name: values for name, values in zip(EXPENSE_COLUMNS, columns)
+               if any(value is not None for value in values)}
+    if feed_format == expense_feed.FEED_FORMAT:
+        return expense_feed.encode_columns(present, len(rows))
+    return {"data": [{name: values[position] for name, values in present.items() if values[position] is not None}
+                     for position in range(len(rows))]}
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """The process-wide backend chosen by EXPENSE_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if BACKEND == "sqlite":
+                _backend = SQLiteBackend(DB_PATH)
+            else:
+                if BACKEND != "apps_script":
+                    logger.warning(f"Unknown EXPENSE_BACKEND {BACKEND!r}, using the Apps Script")
+                _backend = AppsScriptBackend()
+        return _backend
+
+
+def seed_from_apps_script(store):
+    """Copy the whole sheet into an empty local store; returns the number of rows copied"""
+    if store.count():
+        raise ValueError(f"{store.path} already holds expenses; seed only an empty store")
+    payload = AppsScriptBackend().query({})
+    rows = [row for row in payload.get('data', []) if row.get('date') not in (None, "")]
+    reply = store._store(rows)
+    if reply["status"] != "success":
+        raise ValueError(reply["message"])
+    return reply["inserted"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the local expense store")
+    parser.add_argument("--path", default=DB_PATH, help="SQLite database file")
+    parser.add_argument("--seed-from-apps-script", action="store_true",
+                        help="copy every expense from the Apps Script into an empty store")
+    args = parser.parse_args()
+
+    store = SQLiteBackend(args.path)
+    if args.seed_from_apps_script:
+        print(f"Copied {seed_from_apps_script(store)} expenses into {args.path}")
+    print(f"{store.count()} expenses in {args.path}")
@@ -0,0 +1,218 @@
+"""Process-wide rate limiting for Gemini calls.
+
+All sessions share one RequestScheduler holding two token buckets, one for
+requests per minute and one for (estimated) tokens per minute. Callers wait
+in a priority queue until both buckets can cover their request, so bursts
+from concurrent sessions are smoothed out instead of hitting quota errors.
+ScheduledModel wraps a chat model so every invoke/stream goes through the
+scheduler and 429 / quota errors are retried with jittered backoff.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import logging
+from collections import deque
+
+from langchain_core.runnables import Runnable
+
+logger = logging.getLogger(__name__)
+
+REQUESTS_PER_MINUTE = int(os.environ.get("GEMINI_RPM", 60))
+TOKENS_PER_MINUTE = int(os.environ.get("GEMINI_TPM", 120000))
+
+# Output tokens assumed per call when estimating a request's cost
+DEFAULT_OUTPUT_TOKENS = 400
+
+# Lower runs first; interactive streaming jumps ahead of background fan-out
+INTERACTIVE_PRIORITY = 0
+BACKGROUND_PRIORITY = 1
+
+MAX_RETRIES = 4
+RETRY_BASE_SECONDS = 2
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, bursting up to one minute's worth"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount):
+        """Seconds until `amount` units are available (0 if they are now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        """Remove units; a negative amount refunds them"""
+        self._refill()
+        self.level = min(self.capacity, self.level - min(amount, self.capacity))
+
+
+class RequestScheduler:
+    """Priority queue in front of request- and token-per-minute buckets"""
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._tickets = itertools.count()
+        self.waits = deque(maxlen=100)
+        self.rate_limited = 0
+
+    def acquire(self, tokens, priority=BACKGROUND_PRIORITY):
+        """Block until this request may run; returns the seconds spent waiting"""
+        ticket = (priority, next(self._tickets))
+        started = time.monotonic()
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    timeout = None
+                    # Only the head of the queue may spend budget, so priorities are honoured
+                    if self._waiting[0] == ticket:
+                        timeout = max(self.requests.time_until(1), self.tokens.time_until(tokens))
+                        if timeout <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            break
+                    self._condition.wait(timeout=timeout)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+        waited = time.monotonic() - started
+        self.waits.append(waited)
+        return waited
+
+    def settle(self, estimated, actual):
+        """Correct the token bucket once the real usage of a call is known"""
+        with self._condition:
+            self.tokens.take(actual - estimated)
+            self._condition.notify_all()
+
+    def stats(self):
+        waits = list(self.waits)
+        return {
+            "queue_depth": len(self._waiting),
+            "last_wait": waits[-1] if waits else 0.0,
+            "avg_wait": sum(waits) / len(waits) if waits else 0.0,
+            "max_wait": max(waits) if waits else 0.0,
+            "rate_limited": self.rate_limited,
+        }
+
+
+def is_rate_limit_error(error):
+    """True for HTTP 429 / quota exhaustion errors from the Gemini client"""
+    text = str(error).lower()
+    return (getattr(error, "code", None) == 429 or type(error).__name__ == "ResourceExhausted"
+            or "429" in text or "quota" in text or "rate limit" in text)
+
+
+class ScheduledModel(Runnable):
+    """Runs a chat model through a RequestScheduler with retry on rate limits.
+
+    The priority comes from config["metadata"]["priority"], so callers set it
+    with chain.invoke(..., config={"metadata": {"priority": 0}}).
+    """
+
+    def __init__(self, model, scheduler, output_tokens=DEFAULT_OUTPUT_TOKENS):
+        self.model = model
+        self.scheduler = scheduler
+        self.output_tokens = output_tokens
+
+    def _estimate(self, input):
+        text = input.to_string() if hasattr(input, "to_string") else str(input)
+        # Roughly four characters per token
+        return len(text) // 4 + self.output_tokens
+
+    def _priority(self, config):
+        return ((config or {}).get("metadata") or {}).get("priority", BACKGROUND_PRIORITY)
+
+    def _backoff(self, attempt, error):
+        self.scheduler.rate_limited += 1
+        delay = RETRY_BASE_SECONDS * 2 ** attempt
+        delay += random.uniform(0, delay)
+        logger.warning(f"Gemini rate limited (attempt {attempt + 1}), retrying in {delay:.1f}s: {str(error)}")
+        return delay
+
+    def _settle(self, estimate, reply):
+        usage = getattr(reply, "usage_metadata", None)
+        if usage and usage.get("total_tokens"):
+            self.scheduler.settle(estimate, usage["total_tokens"])
+
+    def invoke(self, input, config=None, **kwargs):
+        estimate = self._estimate(input)
+        for attempt in range(MAX_RETRIES + 1):
+            self.scheduler.acquire(estimate, self._priority(config))
+            try:
+                reply = self.model.invoke(input, config, **kwargs)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_rate_limit_error(e):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+                continue
+            self._settle(estimate, reply)
+            return reply
+
+    async def ainvoke(self, input, config=None, **kwargs):
+        estimate = self._estimate(input)
+        for attempt in range(MAX_RETRIES + 1):
+            await asyncio.to_thread(self.scheduler.acquire, estimate, self._priority(config))
+            try:
+                reply = await self.model.ainvoke(input, config, **kwargs)
+            except Exception as e:
+                if attempt == MAX_RETRIES or not is_rate_limit_error(e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+                continue
+            self._settle(estimate, reply)
+            return reply
+
+    def stream(self, input, config=None, **kwargs):
+        estimate = self._estimate(input)
+        for attempt in range(MAX_RETRIES + 1):
+            self.scheduler.acquire(estimate, self._priority(config))
+            started = False
+            try:
+                for chunk in self.model.stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                # Once output was shown a retry would duplicate it
+                if started or attempt == MAX_RETRIES or not is_rate_limit_error(e):
+                    raise
+                time.sleep(self._backoff(attempt, e))
+
+    async def astream(self, input, config=None, **kwargs):
+        estimate = self._estimate(input)
+        for attempt in range(MAX_RETRIES + 1):
+            await asyncio.to_thread(self.scheduler.acquire, estimate, self._priority(config))
+            started = False
+            try:
+                async for chunk in self.model.astream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or attempt == MAX_RETRIES or not is_rate_limit_error(e):
+                    raise
+                await asyncio.sleep(self._backoff(attempt, e))
+
+
+# Shared by every session of this server process
+scheduler = RequestScheduler()
@@ -0,0 +1,30 @@
+"""Import-time profiling for the Debug tab.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter so
+the numbers reflect a cold start, and parses the per-module report.
+"""
+import subprocess
+import sys
+import os
+
+
+def profile_import(module, top=25):
+    """Return the `top` slowest imports (by cumulative time) triggered by importing `module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, timeout=120,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.rstrip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
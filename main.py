@@ -1,75 +1,100 @@
 import streamlit as st
-import requests
 import json
-from datetime import datetime, timedelta
+import os
+import sys
+import time
+import importlib
+import logging
+from datetime import datetime
 
 # Set page config - must be the first Streamlit command
 st.set_page_config(page_title="Expense Tracker", page_icon="✦", layout="wide")
 
-# Import analytics AFTER setting page config
-# Using a function import to prevent code in analytics.py from running at import time
-from analytics import show_analytics
+logging.basicConfig(
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+# Only the light modules needed by the New Expense tab are imported up front;
+# analytics (pandas + plotly) and the import page are loaded on first use
+import apps_script_client
+import expense_store
+import perf_trace
+from expense_refresher import shared_refresher
+from perf_trace import traced
+from submission_queue import SubmissionQueue
+from expense_schema import CATEGORIES, PAYMENT_METHODS, BILLING_CARDS, get_billing_cycle
+
+# Durable log of queued submissions, drained in the background
+SUBMISSION_QUEUE_PATH = os.environ.get(
+    "EXPENSE_QUEUE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".expense_cache", "submissions.jsonl")
+)
 
 # Initialize variables in session state
 if 'debug_mode' not in st.session_state:
     st.session_state['debug_mode'] = False
 
-# Function to get billing cycle
-def get_billing_cycle(date_obj):
-    day = date_obj.day
-    
-    if day < 16:
-        last_month = date_obj.replace(day=1) - timedelta(days=1)
-        start_month = last_month.replace(day=25)
-        end_month = date_obj.replace(day=25)
-    else:
-        start_month = date_obj.replace(day=25)
-        next_month = date_obj.replace(day=28) + timedelta(days=4)
-        end_month = next_month.replace(day=25)
-    
-    start_month_str = start_month.strftime("%b")
-    end_month_str = end_month.strftime("%b")
-    
-    return f"{start_month_str} 25 - {end_month_str} 25"
-
 # Function to submit data to Google Apps Script
+@traced("submit_to_google_apps_script")
 def submit_to_google_apps_script(data):
-    apps_script_url = "https://script.google.com/macros/s/AKfycbwISgM-mNsc6fZmKki2ImDKhsePg_Ixbcku3Ofw9_feNE9OuDUEDamLylrwK5kLB7vGZg/exec"
-    
+    # Sent to whichever store EXPENSE_BACKEND selects; every backend replies in the script's format
     try:
-        headers = {
-            "Content-Type": "application/json",
-            "Accept": "application/json"
-        }
-        
-        # Convert data to JSON string
-        json_data = json.dumps(data)
-        
         # Log the data being sent for debugging
         if st.session_state['debug_mode']:
-            st.write(f"Sending data: {json_data}")
+            st.write(f"Sending data: {json.dumps(data)}")
         
-        response = requests.post(
-            apps_script_url,
-            data=json_data,
-            headers=headers
-        )
+        reply = expense_store.get_backend().submit(data)
         
-        # Log the response for debugging
+        # Log the reply for debugging
         if st.session_state['debug_mode']:
-            st.write(f"Response status code: {response.status_code}")
-            st.write(f"Response content: {response.text[:100]}")  # Show first 100 chars
+            st.write(f"Reply: {json.dumps(reply)[:100]}")  # Show first 100 chars
         
-        if response.status_code == 200:
-            try:
-                return response.json()
-            except json.JSONDecodeError:
-                return {"status": "error", "message": "Failed to parse response JSON"}
-        else:
-            return {"status": "error", "message": f"HTTP Status: {response.status_code}"}
+        return reply
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
+# Seconds each lazily loaded module took to import, shown in the Debug tab
+@st.cache_resource
+def get_load_times():
+    return {}
+
+# Heavy modules are imported once per server process, the first time a tab needs them
+@st.cache_resource(show_spinner="Loading...")
+def load_module(name):
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    get_load_times()[name] = time.perf_counter() - started
+    return module
+
+def invalidate_expense_cache():
+    # Nothing is cached in this process until analytics has been loaded, and the
+    # snapshot it restores then starts out expired, so the first read syncs it
+    analytics = sys.modules.get("analytics")
+    if analytics is not None:
+        analytics.invalidate_expense_cache()
+
+# One submission queue and worker thread per server process, shared by all sessions
+@st.cache_resource
+def get_submission_queue():
+    backend = expense_store.get_backend()
+    queue = SubmissionQueue(
+        SUBMISSION_QUEUE_PATH,
+        apps_script_client.submit_json,
+        on_sent=None if backend.local else lambda data: invalidate_expense_cache()
+    )
+    queue.start()
+    # With a local store the queue only carries the script's asynchronous copy
+    if backend.local and expense_store.MIRROR_TO_APPS_SCRIPT:
+        backend.mirror = queue.enqueue
+    return queue
+
+# Keeps the shared expense dataset fresh in the background, once per server process. The
+# thread also imports analytics, so the Trends tab is warm before it is first opened
+@st.cache_resource
+def start_expense_refresher():
+    shared_refresher.start(lambda: importlib.import_module("analytics").background_refresh())
+
 # Reset form fields
 def reset_form():
     for key in list(st.session_state.keys()):
@@ -77,118 +102,137 @@ def reset_form():
             if key in st.session_state:
                 del st.session_state[key]
 
-def main():
-    # Create tabs
-    tab1, tab2, tab3 = st.tabs(["New Expense", "Trends", "Debug"])
+# A fragment: typing, toggling "Shared expense" or changing the split reruns only the
+# form, never the Trends tab and its fetch
+@st.fragment
+def expense_form():
+    backend = expense_store.get_backend()
     
-    with tab1:
-        # Header
-        st.title("Small Expense Tracker")
-        st.write("Track spending fast with clarity")
-        
-        # Basic input fields
-        expense_name = st.text_input("Expense name", key="expense_name_input")
-        
-        # Categories
-        categories = [
-            "Miscellaneous", "Bike", "Auto/Cab", "Public transport", "Groceries", "Eating out", 
-            "Party", "Household supplies", "Education", "Gift", "Cinema", "Entertainment", 
-            "Rent/Maintenance", "Furniture", "Services", "Electricity", "Internet", "Investment", 
-            "Insurance", "Medical expenses", "Flights", "Travel", "Clothes", "Gas", "Phone"
-        ]
-        
-        # Create two columns for inputs
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            category = st.selectbox("Category", categories, key="category_input")
-            payment_methods = ["Cred UPI", "Credit card", "GPay UPI", "Pine Perks", "Cash", "Debit card", "Net Banking"]
-            payment_method = st.selectbox("Payment method", payment_methods, key="payment_method_input")
+    # Header
+    st.title("Small Expense Tracker")
+    st.write("Track spending fast with clarity")
+    
+    # Confirmation for the expense queued before the last rerun
+    if 'last_queued_expense' in st.session_state:
+        st.success(f"Added \"{st.session_state.pop('last_queued_expense')}\""
+                   + ("" if backend.local else " - syncing in the background"))
+    
+    # Basic input fields
+    expense_name = st.text_input("Expense name", key="expense_name_input")
+    
+    # Create two columns for inputs
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        category = st.selectbox("Category", CATEGORIES, key="category_input")
+        payment_method = st.selectbox("Payment method", PAYMENT_METHODS, key="payment_method_input")
+    
+    with col2:
+        amount = st.number_input("Amount (₹)", min_value=0.0, step=0.01, format="%.2f", key="amount_input")
+        date = st.date_input("Date", value=datetime.now().date(), key="date_input")
+    
+    # Shared expense checkbox
+    shared = st.checkbox("Shared expense", key="shared_input")
+    
+    # Show split options if shared expense is checked
+    if shared:
+        split_col1, split_col2 = st.columns(2)
         
-        with col2:
-            amount = st.number_input("Amount (₹)", min_value=0.0, step=0.01, format="%.2f", key="amount_input")
-            date = st.date_input("Date", value=datetime.now().date(), key="date_input")
+        with split_col1:
+            split_between = st.number_input("Split between (number of people)", min_value=1, value=2, step=1, key="split_between_input")
         
-        # Shared expense checkbox
-        shared = st.checkbox("Shared expense", key="shared_input")
+        with split_col2:
+            # Calculate default split amount
+            if amount > 0 and split_between > 0:
+                default_split = amount / split_between
+            else:
+                default_split = 0.0
+            
+            split_amount = st.number_input("Split Amount (₹)", min_value=0.0, value=default_split, format="%.2f", key="split_amount_input")
         
-        # Show split options if shared expense is checked
-        if shared:
-            split_col1, split_col2 = st.columns(2)
+        # Display calculation
+        if amount > 0 and split_between > 1:
+            st.info(f"Split Amount = {amount:.2f} ÷ {split_between} = {default_split:.2f}")
+    
+    # Credit card billing cycle
+    if payment_method in BILLING_CARDS:
+        billing_cycle = get_billing_cycle(date, payment_method)
+        st.info(f"Billing Cycle: {billing_cycle}")
+    
+    # Add expense button outside of any form
+    if st.button("Add expense", use_container_width=True, key="add_expense_button"):
+        if not expense_name:
+            st.error("Please enter an expense name.")
+        elif amount <= 0:
+            st.error("Amount must be greater than 0.")
+        else:
+            # Calculate final amount
+            final_amount = amount
+            original_amount = amount
             
-            with split_col1:
-                split_between = st.number_input("Split between (number of people)", min_value=1, value=2, step=1, key="split_between_input")
+            if shared:
+                # Use split amount if provided
+                split_amount_value = st.session_state.get('split_amount_input', 0.0)
+                if split_amount_value > 0:
+                    final_amount = split_amount_value
             
-            with split_col2:
-                # Calculate default split amount
-                if amount > 0 and split_between > 0:
-                    default_split = amount / split_between
-                else:
-                    default_split = 0.0
-                
-                split_amount = st.number_input("Split Amount (₹)", min_value=0.0, value=default_split, format="%.2f", key="split_amount_input")
+            # Prepare data for submission
+            data = {
+                "expenseName": expense_name,
+                "category": category,
+                "amount": final_amount,
+                "originalAmount": original_amount,
+                "date": date.strftime("%Y-%m-%d"),
+                "month": date.strftime("%B"),
+                "year": date.year,
+                "paymentMethod": payment_method,
+                "shared": "Yes" if shared else "No",
+                "billingCycle": get_billing_cycle(date, payment_method),
+                "timeStamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
             
-            # Display calculation
-            if amount > 0 and split_between > 1:
-                st.info(f"Split Amount = {amount:.2f} ÷ {split_between} = {default_split:.2f}")
-        
-        # Credit card billing cycle
-        if payment_method == "Credit card":
-            billing_cycle = get_billing_cycle(date)
-            st.info(f"Billing Cycle: {billing_cycle}")
-        
-        # Add expense button outside of any form
-        if st.button("Add expense", use_container_width=True, key="add_expense_button"):
-            if not expense_name:
-                st.error("Please enter an expense name.")
-            elif amount <= 0:
-                st.error("Amount must be greater than 0.")
+            # Add split details if shared expense
+            if shared:
+                data["splitBetween"] = split_between
+                data["splitAmount"] = split_amount_value
+            
+            if backend.local:
+                # A local store takes the row in milliseconds, so it is written right away
+                reply = backend.submit(data)
+                if reply.get("status") != "success":
+                    st.error(f"Could not save the expense: {reply.get('message', 'Unknown error')}")
+                    return
+                invalidate_expense_cache()
             else:
-                # Calculate final amount
-                final_amount = amount
-                original_amount = amount
-                
-                if shared:
-                    # Use split amount if provided
-                    split_amount_value = st.session_state.get('split_amount_input', 0.0)
-                    if split_amount_value > 0:
-                        final_amount = split_amount_value
-                
-                # Prepare data for submission
-                data = {
-                    "expenseName": expense_name,
-                    "category": category,
-                    "amount": final_amount,
-                    "originalAmount": original_amount,
-                    "date": date.strftime("%Y-%m-%d"),
-                    "month": date.strftime("%B"),
-                    "year": date.year,
-                    "paymentMethod": payment_method,
-                    "shared": "Yes" if shared else "No",
-                    "billingCycle": get_billing_cycle(date) if payment_method == "Credit card" else "",
-                    "timeStamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-                
-                # Add split details if shared expense
-                if shared:
-                    data["splitBetween"] = split_between
-                    data["splitAmount"] = split_amount_value
-                
-                # Submit to Google Apps Script
-                with st.spinner("Adding expense..."):
-                    response = submit_to_google_apps_script(data)
-                    
-                    if response.get("status") == "success":
-                        st.success("Expense added successfully!")
-                        reset_form()
-                        st.rerun()
-                    else:
-                        st.error(f"Error: {response.get('message', 'Unknown error')}")
-                        st.error("Please check the Debug tab for more information.")
+                # Queue for background submission to Google Apps Script and reset the form right away
+                get_submission_queue().enqueue(data)
+            st.session_state['last_queued_expense'] = expense_name
+            reset_form()
+            # Full rerun so the Trends tab picks up the queued expense
+            st.rerun()
+
+def main():
+    backend = expense_store.get_backend()
+    # Started on every run so mirroring to the script is wired before the first local write
+    queue = get_submission_queue()
+    # A local store is read directly and needs no refreshing
+    if not backend.local:
+        start_expense_refresher()
+    
+    # Create tabs
+    tab1, tab2, tab_import, tab3 = st.tabs(["New Expense", "Trends", "Import", "Debug"])
+    
+    with tab1:
+        expense_form()
     
     with tab2:
         # Call the analytics function
-        show_analytics()
+        # Rows written to a local store are already in it; only queued script submissions are pending
+        load_module("analytics").show_analytics(pending_rows=None if backend.local else queue.pending_rows())
+    
+    with tab_import:
+        # Bulk CSV / statement import, sent as batch POSTs
+        load_module("expense_import").show_import(on_imported=invalidate_expense_cache)
     
     with tab3:
         st.header("Debug Information")
@@ -197,7 +241,9 @@ def main():
         # Toggle for debug mode
         st.session_state['debug_mode'] = st.checkbox("Enable Debug Mode", value=st.session_state['debug_mode'])
         
-        if st.button("Test Connection to Google Apps Script"):
+        st.write(f"Storage backend: {backend.label}")
+        
+        if st.button(f"Test Connection to {backend.label}"):
             with st.spinner("Testing connection..."):
                 test_data = {
                     "test": True,
@@ -206,6 +252,67 @@ def main():
                 
                 response = submit_to_google_apps_script(test_data)
                 st.json(response)
+        
+        # Background submission status
+        st.subheader("Submission queue")
+        pending_count = queue.pending_count()
+        st.write(f"Pending: {pending_count}")
+        queue_rows = queue.status_rows()
+        if queue_rows:
+            st.dataframe(queue_rows, use_container_width=True)
+            if pending_count and st.button("Retry pending submissions now"):
+                queue.retry_now()
+                st.rerun()
+        else:
+            st.write("No submissions yet.")
+        
+        # Latency of recent Apps Script calls made by this server process
+        st.subheader("Apps Script calls")
+        calls = apps_script_client.recent_calls()
+        if calls:
+            st.dataframe(calls, use_container_width=True)
+        else:
+            st.write("No calls recorded yet.")
+        
+        # Where recent page runs, submissions and tweet generations spent their time
+        st.subheader("Performance")
+        trace_list = perf_trace.traces()
+        if trace_list:
+            trace_id = st.selectbox(
+                "Trace",
+                list(trace_list),
+                key="perf_trace",
+                format_func=lambda key: (f"#{key} {trace_list[key][0]['name']} · "
+                                         f"{trace_list[key][0]['wall_ms']:.0f} ms · {trace_list[key][0]['started_at']}")
+            )
+            spans = trace_list[trace_id]
+            # Plotly is only imported once the waterfall is asked for
+            if st.toggle("Show waterfall"):
+                st.plotly_chart(perf_trace.waterfall_figure(spans), use_container_width=True)
+            st.dataframe(spans, use_container_width=True)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button("Download trace (JSONL)", perf_trace.to_jsonl(spans),
+                                   file_name=f"trace-{trace_id}.jsonl", mime="application/jsonl")
+            with col2:
+                st.download_button("Download all spans (JSONL)", perf_trace.to_jsonl(perf_trace.recent_spans()),
+                                   file_name="spans.jsonl", mime="application/jsonl")
+        else:
+            st.write("No traces recorded yet.")
+        
+        # Cold-start cost of the lazily loaded modules
+        st.subheader("Startup")
+        load_times = get_load_times()
+        if load_times:
+            st.dataframe([{"module": name, "load_ms": round(seconds * 1000, 1)} for name, seconds in load_times.items()],
+                         use_container_width=True)
+        else:
+            st.write("No lazy modules loaded yet.")
+        profile_module = st.selectbox("Import-time profile for", ["main", "analytics", "expense_import", "tweet_gen"])
+        if st.button("Profile imports"):
+            with st.spinner(f"Importing {profile_module} in a fresh interpreter..."):
+                from import_profile import profile_import
+                st.dataframe(profile_import(profile_module), use_container_width=True)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,144 @@
+"""Lightweight timing spans for finding where a slow page spends its time.
+
+    with span("fetch.decode_json") as s:
+        payload = response.json()
+        s["rows"] = len(payload.get("data", []))
+
+Each span records wall and CPU time (of the calling thread) and optional
+row counts. Spans opened inside another one nest under it; the outermost
+span of a thread starts a new trace. Finished spans are kept in memory for
+the Debug tab's waterfall. If PERF_TRACE_PATH is set, each finished trace
+is also appended to that file as JSON lines for offline analysis.
+"""
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Finished spans kept for the Debug tab, across all sessions of this process
+MAX_SPANS = 2000
+
+TRACE_PATH = os.environ.get("PERF_TRACE_PATH")
+
+# Finished traces (span lists, root first), oldest first; evicted a whole trace at a time
+_traces = deque()
+_span_count = 0
+_spans_lock = threading.Lock()
+_local = threading.local()
+_trace_ids = itertools.count(1)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time the enclosed block; yields a dict for attributes such as rows"""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    if not stack:
+        _local.trace = {"id": next(_trace_ids), "started": time.perf_counter(), "spans": []}
+    trace = _local.trace
+    record = {
+        "trace": trace["id"],
+        "name": name,
+        "depth": len(stack),
+        "started_at": datetime.now().isoformat(timespec="milliseconds"),
+        **attributes,
+    }
+    stack.append(record)
+    wall_started = time.perf_counter()
+    cpu_started = time.thread_time()
+    try:
+        yield record
+    except Exception as e:
+        record["error"] = str(e)
+        raise
+    finally:
+        record["start_ms"] = round((wall_started - trace["started"]) * 1000, 3)
+        record["wall_ms"] = round((time.perf_counter() - wall_started) * 1000, 3)
+        record["cpu_ms"] = round((time.thread_time() - cpu_started) * 1000, 3)
+        stack.pop()
+        trace["spans"].append(record)
+        if not stack:
+            _finish(trace["spans"])
+
+
+def traced(name):
+    """Decorator running the whole function inside a span"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _finish(spans):
+    global _span_count
+    # Parents finish after their children; store them in start order
+    spans.sort(key=lambda record: (record["start_ms"], record["depth"]))
+    with _spans_lock:
+        _traces.append(spans)
+        _span_count += len(spans)
+        # Dropping whole traces keeps every kept trace starting at its root span
+        while _span_count > MAX_SPANS and len(_traces) > 1:
+            _span_count -= len(_traces.popleft())
+    if TRACE_PATH:
+        try:
+            with open(TRACE_PATH, "a") as f:
+                f.write(to_jsonl(spans))
+        except OSError as e:
+            logger.warning(f"Could not append spans to {TRACE_PATH}: {str(e)}")
+
+
+def recent_spans():
+    """Snapshot of the finished spans, oldest first"""
+    with _spans_lock:
+        return [record for spans in _traces for record in spans]
+
+
+def traces():
+    """Finished traces as {trace id: [spans]}, newest first; each list starts with the root span"""
+    with _spans_lock:
+        return {spans[0]["trace"]: list(spans) for spans in reversed(_traces)}
+
+
+def to_jsonl(spans):
+    return "".join(json.dumps(record, default=str) + "\n" for record in spans)
+
+
+def waterfall_figure(spans):
+    """Horizontal bar per span, offset by its start within the trace"""
+    import plotly.graph_objects as go
+
+    labels = [f"{'  ' * record['depth']}{record['name']}" for record in spans]
+    hover = [f"{record['name']}<br>wall {record['wall_ms']:.1f} ms · cpu {record['cpu_ms']:.1f} ms"
+             + (f"<br>{record['rows']:,} rows" if record.get('rows') is not None else "")
+             for record in spans]
+    fig = go.Figure(go.Bar(
+        y=list(range(len(spans))),  # Positions, since span names repeat
+        x=[record["wall_ms"] for record in spans],
+        base=[record["start_ms"] for record in spans],
+        orientation='h',
+        hovertext=hover,
+        hoverinfo='text',
+        marker_color=["#FF8A65" if record.get("error") else "#7986CB" for record in spans],
+    ))
+    fig.update_layout(
+        template='plotly_dark',
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        margin=dict(l=20, r=20, t=40, b=20),
+        height=max(250, 28 * len(spans) + 80),
+        xaxis_title="ms since trace start",
+        yaxis=dict(autorange='reversed', tickvals=list(range(len(spans))), ticktext=labels),
+    )
+    return fig
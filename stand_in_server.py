@@ -0,0 +1,211 @@
+"""Local stand-in for the Google Apps Script web app.
+
+Implements the same JSON contract as the deployed script so the tracker can be
+run and exercised offline:
+
+    APPS_SCRIPT_URL=http://127.0.0.1:8765/exec streamlit run main.py
+
+GET  /exec                  -> {"status", "data": [...], "version"}
+GET  /exec?action=version   -> {"status", "version"}
+GET  /exec?since=<stamp>    -> rows with timeStamp >= stamp, plus "since" echoed back and
+                               "total", the number of rows in the sheet
+GET  /exec?action=periods   -> {"status", "periods": [{"year", "month", "count"}], "version"}
+GET  /exec?year=&month=&category=&paymentMethod=&from=&to=&limit=&cursor=
+                            -> matching rows, at most `limit` of them, with the
+                               filters echoed back and "nextCursor" (null on the
+                               last page) to pass as cursor for the next one.
+                               from/to are inclusive YYYY-MM-DD dates.
+POST /exec  <expense JSON>  -> appends the row, {"status": "success"}
+POST /exec  {"action": "batch", "rows": [...]}
+                            -> appends every row, {"status", "inserted", "duplicates"}
+
+Any GET returning rows also accepts format=columnar, which replaces "data"
+with the column-oriented feed from expense_feed.py. Replies are gzip- or
+deflate-compressed when the client's Accept-Encoding allows it.
+
+A POST whose idempotencyKey was already stored is acknowledged without
+appending it again. --failure-rate makes a share of requests fail with
+HTTP 503, half of them after the row was stored (a lost acknowledgement),
+to exercise the client's retry and replay paths.
+"""
+import argparse
+import gzip
+import json
+import zlib
+from collections import Counter
+import random
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+from expense_feed import FEED_FORMAT, encode_columnar
+from expense_store import DEFAULT_PAGE_SIZE, FILTER_PARAMS
+
+
+def _matches(row, filters):
+    date = str(row.get('date', ''))[:10]
+    if 'year' in filters and date[:4] != filters['year']:
+        return False
+    if 'month' in filters and date[5:7] != filters['month'].zfill(2):
+        return False
+    if 'from' in filters and date < filters['from']:
+        return False
+    if 'to' in filters and date > filters['to']:
+        return False
+    return all(str(row.get(field, '')) == filters[field]
+               for field in ('category', 'paymentMethod') if field in filters)
+
+
+class StandInScript:
+    """In-memory expense sheet behind the stand-in server"""
+
+    def __init__(self, rows=None, failure_rate=0.0):
+        self.rows = list(rows or [])
+        self.revision = 0
+        self.failure_rate = failure_rate
+        self.keys = {row['idempotencyKey'] for row in self.rows if row.get('idempotencyKey')}
+        self.lock = threading.Lock()
+
+    @property
+    def version(self):
+        return f"{self.revision}-{len(self.rows)}"
+
+    def handle_get(self, params):
+        reply = self._get(params)
+        if params.get('format') == FEED_FORMAT and 'data' in reply:
+            reply.update(encode_columnar(reply.pop('data')))
+        return reply
+
+    def _get(self, params):
+        with self.lock:
+            if params.get('action') == 'version':
+                return {"status": "success", "version": self.version}
+            if params.get('action') == 'periods':
+                counts = Counter(str(row.get('date', ''))[:7] for row in self.rows)
+                periods = [{"year": int(period[:4]), "month": int(period[5:7]), "count": count}
+                           for period, count in sorted(counts.items()) if len(period) == 7]
+                return {"status": "success", "periods": periods, "version": self.version}
+            filters = {key: params[key] for key in FILTER_PARAMS if key in params}
+            if filters or 'cursor' in params:
+                return self._slice(filters, int(params.get('cursor') or 0),
+                                   int(params.get('limit') or DEFAULT_PAGE_SIZE))
+            if 'since' in params:
+                since = params['since']
+                data = [row for row in self.rows if str(row.get('timeStamp', '')) >= since]
+                return {"status": "success", "data": data, "since": since, "total": len(self.rows),
+                        "version": self.version}
+            return {"status": "success", "data": list(self.rows), "version": self.version}
+
+    def _slice(self, filters, start, limit):
+        # Caller holds self.lock. The cursor is a sheet row index, so rows
+        # appended while paging never shift pages already served.
+        data = []
+        position = start
+        while position < len(self.rows) and len(data) < limit:
+            if _matches(self.rows[position], filters):
+                data.append(self.rows[position])
+            position += 1
+        more = any(_matches(row, filters) for row in self.rows[position:])
+        return {"status": "success", "data": data, "filters": filters,
+                "nextCursor": str(position) if more else None, "version": self.version}
+
+    def handle_post(self, payload):
+        if payload.get('test'):
+            return {"status": "success", "message": "Connection OK"}
+        with self.lock:
+            if payload.get('action') == 'batch':
+                inserted = sum(self._append_row(row) for row in payload.get('rows', []))
+                return {"status": "success", "inserted": inserted,
+                        "duplicates": len(payload.get('rows', [])) - inserted}
+            if not self._append_row(payload):
+                return {"status": "success", "duplicate": True}
+        return {"status": "success"}
+
+    def _append_row(self, payload):
+        # Caller holds self.lock; returns False for an already stored idempotencyKey
+        key = payload.get('idempotencyKey')
+        if key and key in self.keys:
+            return False
+        row = dict(payload)
+        row.setdefault('timeStamp', datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        self.rows.append(row)
+        self.revision += 1
+        if key:
+            self.keys.add(key)
+        return True
+
+    def should_fail(self):
+        return random.random() < self.failure_rate
+
+
+def _make_handler(script):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body, status=200):
+            encoded = json.dumps(body, separators=(',', ':')).encode('utf-8')
+            accepted = self.headers.get("Accept-Encoding", "")
+            encoding = "gzip" if "gzip" in accepted else "deflate" if "deflate" in accepted else None
+            if encoding == "gzip":
+                encoded = gzip.compress(encoded)
+            elif encoding == "deflate":
+                encoded = zlib.compress(encoded)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self.send_header("Content-Length", str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def do_GET(self):
+            if script.should_fail():
+                self._reply({"status": "error", "message": "Simulated failure"}, status=503)
+                return
+            query = parse_qs(urlparse(self.path).query)
+            params = {key: values[-1] for key, values in query.items()}
+            self._reply(script.handle_get(params))
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except json.JSONDecodeError:
+                self._reply({"status": "error", "message": "Invalid JSON"}, status=400)
+                return
+            if script.should_fail():
+                # Half the failures happen after the write, losing only the acknowledgement
+                if random.random() < 0.5:
+                    script.handle_post(payload)
+                self._reply({"status": "error", "message": "Simulated failure"}, status=503)
+                return
+            self._reply(script.handle_post(payload))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def start_stand_in_server(rows=None, host="127.0.0.1", port=0, failure_rate=0.0):
+    """Serve a StandInScript on a daemon thread; returns (server, script, url)"""
+    script = StandInScript(rows, failure_rate)
+    server = ThreadingHTTPServer((host, port), _make_handler(script))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://{host}:{server.server_address[1]}/exec"
+    return server, script, url
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the expense Apps Script")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--failure-rate", type=float, default=0.0,
+                        help="share of requests answered with HTTP 503")
+    args = parser.parse_args()
+
+    server, script, url = start_stand_in_server(host=args.host, port=args.port, failure_rate=args.failure_rate)
+    print(f"Stand-in Apps Script listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
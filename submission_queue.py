@@ -0,0 +1,204 @@
+"""Durable background queue (write-ahead log) for expense submissions.
+
+"Add expense" appends the row to a local JSON-lines log and returns at once;
+a daemon worker replays the log to the Apps Script with retry. The log is
+append-only: each line is an event ("enqueued", "sent", "attempt_failed")
+and the queue state is rebuilt by replaying it, so entries still pending
+when the server stops are sent after the next start.
+
+Every entry carries a client-generated idempotencyKey that is sent with the
+row. The script ignores a key it has already stored, so an entry whose
+acknowledgement was lost can be replayed without creating a duplicate.
+Unacknowledged entries are retried until they succeed (offline-first).
+"""
+import json
+import os
+import threading
+import time
+import uuid
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts: 5s, 10s, 20s ... capped at 5 minutes
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+# Sent entries kept when the log is compacted at startup
+KEEP_SENT = 50
+
+
+class SubmissionQueue:
+    """Append-only JSONL queue drained by a single background worker thread"""
+
+    def __init__(self, path, submit, on_sent=None):
+        self.path = path
+        # submit(data) -> reply dict with "status"; must not touch Streamlit
+        self.submit = submit
+        self.on_sent = on_sent
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._load()
+
+    def enqueue(self, data):
+        """Durably record a submission and wake the worker; returns its idempotency key.
+
+        A payload that already carries an idempotencyKey (e.g. a row mirrored
+        from the local store) keeps it.
+        """
+        key = data.get("idempotencyKey") or uuid.uuid4().hex
+        data = {**data, "idempotencyKey": key}
+        entry = {
+            "id": key,
+            "data": data,
+            "status": "pending",
+            "attempts": 0,
+            "error": None,
+            "enqueued_at": _now(),
+            "updated_at": _now(),
+            "next_attempt": 0.0,
+        }
+        with self.lock:
+            self.entries[entry["id"]] = entry
+            self._append({"event": "enqueued", "id": entry["id"], "data": data, "time": entry["enqueued_at"]})
+        self._wake.set()
+        return entry["id"]
+
+    def retry_now(self):
+        """Skip the backoff and replay every pending entry immediately (e.g. back online)"""
+        with self.lock:
+            for entry in self.entries.values():
+                if entry["status"] == "pending":
+                    entry["next_attempt"] = 0.0
+        self._wake.set()
+
+    def start(self):
+        """Start the worker thread once per queue"""
+        with self.lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="submission-queue", daemon=True)
+                self._thread.start()
+
+    def pending_count(self):
+        with self.lock:
+            return sum(1 for entry in self.entries.values() if entry["status"] == "pending")
+
+    def pending_rows(self):
+        """Data of entries not yet acknowledged by the script, for local analytics"""
+        with self.lock:
+            return [entry["data"] for entry in self.entries.values() if entry["status"] == "pending"]
+
+    def status_rows(self):
+        """Entries for display, newest first"""
+        with self.lock:
+            rows = [{
+                "expense": entry["data"].get("expenseName", ""),
+                "amount": entry["data"].get("amount", ""),
+                "status": entry["status"],
+                "attempts": entry["attempts"],
+                "error": entry["error"],
+                "enqueued_at": entry["enqueued_at"],
+                "updated_at": entry["updated_at"],
+            } for entry in self.entries.values()]
+        return list(reversed(rows))
+
+    def _run(self):
+        while True:
+            entry = self._next_due()
+            if entry is None:
+                # Sleep until an enqueue, or until the earliest retry is due
+                self._wake.wait(timeout=self._seconds_until_due())
+                self._wake.clear()
+                continue
+
+            reply = self.submit(entry["data"])
+            with self.lock:
+                entry["attempts"] += 1
+                entry["updated_at"] = _now()
+                if reply.get("status") == "success":
+                    entry.update(status="sent", error=None)
+                    self._append({"event": "sent", "id": entry["id"], "time": entry["updated_at"]})
+                else:
+                    entry["error"] = reply.get("message", "Unknown error")
+                    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (entry["attempts"] - 1))
+                    entry["next_attempt"] = time.monotonic() + delay
+                    self._append({"event": "attempt_failed", "id": entry["id"], "error": entry["error"], "time": entry["updated_at"]})
+                    logger.warning(f"Submission {entry['id']} attempt {entry['attempts']} failed: {entry['error']}")
+
+            if entry["status"] == "sent" and self.on_sent is not None:
+                self.on_sent(entry["data"])
+
+    def _next_due(self):
+        now = time.monotonic()
+        with self.lock:
+            for entry in self.entries.values():
+                if entry["status"] == "pending" and entry["next_attempt"] <= now:
+                    return entry
+        return None
+
+    def _seconds_until_due(self):
+        with self.lock:
+            waits = [entry["next_attempt"] - time.monotonic()
+                     for entry in self.entries.values() if entry["status"] == "pending"]
+        return max(0.0, min(waits)) if waits else None
+
+    def _append(self, event):
+        # Caller holds self.lock; fsync so an acknowledged enqueue survives a crash
+        with open(self.path, "a", encoding="utf-8") as log:
+            log.write(json.dumps(event) + "\n")
+            log.flush()
+            os.fsync(log.fileno())
+
+    def _load(self):
+        """Rebuild queue state from the log, then compact it"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as log:
+            for line in log:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    continue
+                self._apply(event)
+        self._compact()
+
+    def _apply(self, event):
+        if event["event"] == "enqueued":
+            # Entries logged before idempotency keys existed use their entry id as the key
+            data = {**event["data"], "idempotencyKey": event["data"].get("idempotencyKey", event["id"])}
+            self.entries[event["id"]] = {
+                "id": event["id"], "data": data, "status": "pending", "attempts": 0,
+                "error": None, "enqueued_at": event["time"], "updated_at": event["time"], "next_attempt": 0.0,
+            }
+            return
+        entry = self.entries.get(event["id"])
+        if entry is None:
+            return
+        entry["updated_at"] = event["time"]
+        if event["event"] == "sent":
+            entry.update(status="sent", error=None)
+        elif event["event"] == "attempt_failed":
+            entry["attempts"] += 1
+            entry["error"] = event.get("error")
+
+    def _compact(self):
+        """Rewrite the log with unsent entries plus the most recent sent ones"""
+        sent = [entry for entry in self.entries.values() if entry["status"] == "sent"]
+        for entry in sent[:-KEEP_SENT]:
+            del self.entries[entry["id"]]
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as log:
+            for entry in self.entries.values():
+                log.write(json.dumps({"event": "enqueued", "id": entry["id"], "data": entry["data"],
+                                      "time": entry["enqueued_at"]}) + "\n")
+                if entry["status"] == "sent":
+                    log.write(json.dumps({"event": "sent", "id": entry["id"], "time": entry["updated_at"]}) + "\n")
+        os.replace(temp_path, self.path)
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import apps_script_client
+import expense_cache
+from stand_in_server import start_stand_in_server
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    """A fresh shared expense cache that snapshots into tmp_path"""
+    fresh = expense_cache.ExpenseCache()
+    fresh.snapshot_path = str(tmp_path / "expenses.feather")
+    monkeypatch.setattr(expense_cache, "shared_cache", fresh)
+    return fresh
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    """Start a stand-in script and point the client at it; yields a function (rows, failure_rate) -> script"""
+    monkeypatch.setattr(apps_script_client, "BACKOFF_SECONDS", 0.001)
+    servers = []
+
+    def start(rows=None, failure_rate=0.0):
+        server, script, url = start_stand_in_server(rows, failure_rate=failure_rate)
+        servers.append(server)
+        monkeypatch.setattr(apps_script_client, "SCRIPT_URL", url)
+        return script
+
+    yield start
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,38 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+from billing_cycles import billing_cycle_labels
+from expense_schema import billing_cycle_id, billing_cycle_label, get_billing_cycle
+
+
+def _original_stamp(date_obj):
+    """billingCycle text as the expense form has always written it"""
+    if date_obj.day < 16:
+        start = (date_obj.replace(day=1) - timedelta(days=1)).replace(day=25)
+        end = date_obj.replace(day=25)
+    else:
+        start = date_obj.replace(day=25)
+        end = (date_obj.replace(day=28) + timedelta(days=4)).replace(day=25)
+    return f"{start.strftime('%b')} 25 - {end.strftime('%b')} 25"
+
+
+def test_form_and_import_keep_the_stored_stamp_format():
+    days = [date(2023, 12, 1) + timedelta(days=offset) for offset in range(800)]
+
+    stamps = billing_cycle_labels(pd.to_datetime(days), ["Credit card"] * len(days))
+
+    expected = [_original_stamp(day) for day in days]
+    assert [get_billing_cycle(day, "Credit card") for day in days] == expected
+    assert list(stamps) == expected
+    assert get_billing_cycle(date(2024, 3, 15)) == "Feb 25 - Mar 25"
+
+
+def test_non_card_payments_have_no_stamp():
+    assert get_billing_cycle(date(2024, 3, 15), "Cash") == ""
+    assert list(billing_cycle_labels(pd.to_datetime(["2024-03-15"]), ["Cash"])) == [""]
+
+
+def test_dashboard_label_names_the_cycle_bounds():
+    assert billing_cycle_label(billing_cycle_id(date(2024, 3, 15), 15), 15) == "Feb 16 - Mar 15"
+    assert billing_cycle_label(billing_cycle_id(date(2024, 12, 20), 15), 15) == "Dec 16 - Jan 15"
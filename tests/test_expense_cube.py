@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+import analytics
+from benchmark import generate_ledger
+from expense_store import SQLiteBackend
+
+FILTER_SETS = [
+    {},
+    {'year': 2025},
+    {'year': 2024, 'month': 2},
+    {'month': 12},
+    {'category': "Groceries"},
+    {'paymentMethod': "Credit card", 'from': "2025-01-10", 'to': "2025-03-15"},
+]
+
+
+@pytest.fixture(scope="module")
+def ledger_store(tmp_path_factory):
+    ledger = generate_ledger(3000, seed=7)
+    store = SQLiteBackend(str(tmp_path_factory.mktemp("store") / "expenses.sqlite"))
+    assert store.submit_batch(ledger)["inserted"] == len(ledger)
+    return store, analytics.build_expense_frame(ledger)
+
+
+def _select(frame, filters):
+    mask = pd.Series(True, index=frame.index)
+    for column in ('year', 'month', 'category', 'paymentMethod'):
+        if column in filters:
+            mask &= frame[column] == filters[column]
+    if 'from' in filters:
+        mask &= frame['date'] >= pd.Timestamp(filters['from'])
+    if 'to' in filters:
+        mask &= frame['date'] <= pd.Timestamp(filters['to'])
+    return frame[mask]
+
+
+def _ordered(cube):
+    columns = analytics.CUBE_DIMENSIONS + ['amount', 'count', 'first_date', 'last_date']
+    return cube[columns].sort_values(analytics.CUBE_DIMENSIONS).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("filters", FILTER_SETS, ids=str)
+def test_store_aggregated_cube_matches_the_pandas_cube(ledger_store, filters):
+    store, frame = ledger_store
+
+    pushed_down = analytics.cube_from_cells(store.aggregate_cube(filters))
+    expected = analytics.build_expense_cube(_select(frame, filters))
+
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(_ordered(pushed_down), _ordered(expected), check_exact=False)
@@ -0,0 +1,35 @@
+import io
+
+from expense_import import parse_expense_csv
+
+
+def _parse(text, dayfirst):
+    return parse_expense_csv(io.StringIO(text), "Groceries", "Cash", dayfirst=dayfirst)
+
+
+def test_iso_dates_are_not_read_day_first():
+    rows, errors = _parse("date,description,amount\n"
+                          "2024-03-05,Zepto,120\n"
+                          "05/03/2024,BigBasket,80\n"
+                          "2024-03-05 18:30:00,Swiggy,200\n", dayfirst=True)
+
+    assert errors.empty
+    assert [row['date'] for row in rows] == ["2024-03-05", "2024-03-05", "2024-03-05"]
+    assert [row['month'] for row in rows] == ["March", "March", "March"]
+
+
+def test_dayfirst_only_decides_the_non_iso_rows():
+    text = "date,description,amount\n2024-03-05,Zepto,120\n05/03/2024,BigBasket,80\n"
+
+    rows, _ = _parse(text, dayfirst=False)
+
+    assert [row['date'] for row in rows] == ["2024-03-05", "2024-05-03"]
+
+
+def test_unparseable_and_blank_dates_are_rejected():
+    rows, errors = _parse("date,description,amount\nnot a date,Zepto,120\n,Uber,80\n2024-02-30,Ola,50\n",
+                          dayfirst=True)
+
+    assert rows == []
+    assert list(errors.index) == [2, 3, 4]
+    assert errors['error'].str.contains("invalid date").all()
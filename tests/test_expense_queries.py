@@ -0,0 +1,89 @@
+import pandas as pd
+
+import analytics
+import apps_script_client
+from benchmark import generate_ledger
+
+
+def _legacy(script):
+    """Make the stand-in answer every GET like a script deployed before query support: the whole sheet"""
+    script.handle_get = lambda params: {"status": "success", "data": list(script.rows), "version": script.version}
+
+
+def _calls(action):
+    return sum(call["action"] == action for call in apps_script_client.call_log)
+
+
+def test_slice_is_fetched_page_by_page(stand_in, cache, monkeypatch):
+    ledger = generate_ledger(1000)
+    stand_in(ledger)
+    monkeypatch.setattr(analytics, "SLICE_PAGE_SIZE", 50)
+    year = int(ledger[-1]["date"][:4])
+    expected = [row for row in ledger if row["date"].startswith(str(year))]
+    apps_script_client.call_log.clear()
+
+    frame = analytics.fetch_expense_slice({'year': year})
+
+    assert len(frame) == len(expected)
+    assert list(frame['timeStamp']) == [row["timeStamp"] for row in expected]
+    assert _calls('slice') == -(-len(expected) // 50)
+    # Only the slice was downloaded, and asking again is served from the cache
+    assert cache.frame is None
+    analytics.fetch_expense_slice({'year': year})
+    assert _calls('slice') == -(-len(expected) // 50)
+
+
+def test_slice_holds_only_rows_matching_the_echoed_filters(stand_in, cache):
+    ledger = generate_ledger(500)
+    stand_in(ledger)
+    year, month = int(ledger[-1]["date"][:4]), int(ledger[-1]["date"][5:7])
+    filters = {'year': year, 'month': month, 'category': "Groceries"}
+
+    frame = analytics.fetch_expense_slice(filters)
+
+    expected = [row for row in ledger if row["date"].startswith(f"{year}-{month:02d}")
+                and row["category"] == "Groceries"]
+    assert len(frame) == len(expected) > 0
+    assert set(frame['category']) == {"Groceries"}
+    assert set(zip(frame['year'], frame['month'])) == {(year, month)}
+
+
+def test_script_ignoring_filters_is_used_for_the_full_history(stand_in, cache):
+    script = stand_in(generate_ledger(300))
+    _legacy(script)
+    source = analytics.get_backend().source
+    apps_script_client.call_log.clear()
+
+    assert analytics.fetch_expense_slice({'year': 2024}) is None
+    assert analytics.fetch_expense_periods() is None
+
+    # The full-sheet replies were kept instead of downloading again, and the features aren't asked for again
+    assert len(cache.frame) == 300
+    assert not cache.supports(source, 'filters') and not cache.supports(source, 'periods')
+    assert analytics.fetch_expense_slice({'year': 2024}) is None
+    assert len(apps_script_client.call_log) == 2
+    assert len(analytics.load_filtered_frame({'year': 2024})) == 300
+
+
+def test_reply_without_rows_does_not_mark_a_feature_unsupported(stand_in, cache):
+    script = stand_in(generate_ledger(100))
+    script.handle_get = lambda params: {"status": "success"}
+    source = analytics.get_backend().source
+
+    assert analytics.fetch_expense_slice({'year': 2024}) is None
+    assert analytics.fetch_expense_periods() is None
+
+    assert cache.supports(source, 'filters') and cache.supports(source, 'periods')
+    assert cache.frame is None
+
+
+def test_periods_count_the_rows_of_each_month(stand_in, cache):
+    ledger = generate_ledger(400)
+    stand_in(ledger)
+
+    periods = analytics.fetch_expense_periods()
+
+    expected = pd.Series([row["date"][:7] for row in ledger]).value_counts()
+    assert dict(zip(periods['year'].astype(str) + "-" + periods['month'].map("{:02d}".format),
+                    periods['count'])) == expected.to_dict()
+    assert cache.frame is None
@@ -0,0 +1,128 @@
+import os
+import threading
+
+import pytest
+
+import analytics
+import expense_cache
+from benchmark import generate_ledger
+from expense_store import ExpenseStoreError
+
+
+def test_outage_keeps_the_held_data_and_snapshot(stand_in, cache):
+    script = stand_in(generate_ledger(200))
+    assert len(analytics.sync_expense_data()) == 200
+    snapshot_size = os.path.getsize(cache.snapshot_path)
+
+    # Every request now fails with HTTP 503 and a JSON error body
+    script.failure_rate = 1.0
+    cache.invalidate()
+    with pytest.raises(ExpenseStoreError):
+        analytics.sync_expense_data()
+
+    assert len(cache.frame) == 200
+    assert os.path.getsize(cache.snapshot_path) == snapshot_size
+    assert len(analytics.fetch_expense_data()) == 200
+
+
+def test_error_reply_is_not_stored(stand_in, cache, monkeypatch):
+    stand_in(generate_ledger(50))
+    analytics.sync_expense_data()
+    monkeypatch.setattr(analytics.get_backend(), "query",
+                        lambda params: {"status": "success", "version": "x"})
+
+    with pytest.raises(ExpenseStoreError):
+        analytics.sync_expense_data(force_refresh=True)
+    assert len(cache.frame) == 50
+
+
+def _expense(name, stamp, date="2024-06-01"):
+    return {"expenseName": name, "category": "Groceries", "amount": 10.0, "date": date,
+            "paymentMethod": "Cash", "timeStamp": stamp}
+
+
+def test_delta_sync_merges_new_rows(stand_in, cache):
+    script = stand_in(generate_ledger(100))
+    analytics.sync_expense_data()
+    script.handle_post(_expense("new", "2099-01-01 00:00:00"))
+
+    cache.invalidate()
+    frame = analytics.sync_expense_data()
+
+    assert len(frame) == 101
+    assert cache.delta_syncs == 1
+
+
+def test_row_delivered_late_with_an_older_stamp_is_picked_up(stand_in, cache):
+    script = stand_in(generate_ledger(100))
+    analytics.sync_expense_data()
+    script.handle_post(_expense("newer", "2099-01-02 00:00:00"))
+    cache.invalidate()
+    analytics.sync_expense_data()
+
+    # A retried submission reaches the sheet after newer ones, behind the since cursor
+    script.handle_post(_expense("retried", "2099-01-01 00:00:00"))
+    cache.invalidate()
+    frame = analytics.sync_expense_data()
+
+    assert len(frame) == 102
+    assert "retried" in set(frame['expenseName'])
+    # Later syncs are deltas again
+    cache.invalidate()
+    analytics.sync_expense_data()
+    assert len(cache.frame) == 102
+
+
+def test_delta_merge_skips_rows_already_held_at_the_cursor(stand_in, cache):
+    script = stand_in(generate_ledger(20))
+    script.handle_post(_expense("same second", "2099-01-01 00:00:00"))
+    analytics.sync_expense_data()
+    # Submitted within the same second as the cursor: the inclusive since returns both
+    script.handle_post(_expense("same second too", "2099-01-01 00:00:00"))
+
+    cache.invalidate()
+    frame = analytics.sync_expense_data()
+
+    assert len(frame) == 22
+    assert sorted(frame['expenseName'][frame['timeStamp'] == "2099-01-01 00:00:00"]) == [
+        "same second", "same second too"]
+
+
+def test_delta_reply_without_rows_keeps_the_cursor_in_use(stand_in, cache, monkeypatch):
+    stand_in(generate_ledger(50))
+    analytics.sync_expense_data()
+    source = analytics.get_backend().source
+    query = analytics.get_backend().query
+    monkeypatch.setattr(analytics.get_backend(), "query",
+                        lambda params: {"status": "success"} if "since" in params else query(params))
+
+    cache.invalidate()
+    analytics.sync_expense_data()
+
+    assert cache.supports(source, 'since')
+    assert len(cache.frame) == 50
+
+
+def test_snapshot_is_written_without_holding_the_cache_lock(stand_in, cache, monkeypatch):
+    stand_in(generate_ledger(50))
+    write_feather = expense_cache.feather.write_feather
+    lock_free = []
+
+    def checked_write(table, path):
+        # Another thread (a reading session) must be able to take the lock mid-write
+        def read():
+            acquired = cache.lock.acquire(blocking=False)
+            if acquired:
+                cache.lock.release()
+            lock_free.append(acquired)
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join()
+        write_feather(table, path)
+
+    monkeypatch.setattr(expense_cache.feather, "write_feather", checked_write)
+    analytics.sync_expense_data()
+
+    assert lock_free == [True]
+    assert os.path.exists(cache.snapshot_path)
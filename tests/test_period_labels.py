@@ -0,0 +1,48 @@
+import pandas as pd
+
+import analytics
+
+
+def test_weekly_order_across_year_boundary():
+    grouped = pd.DataFrame({
+        'year': [2025, 2024, 2024, 2025, 2024],
+        'month': [1, 12, 12, 1, 12],
+        'day_week': ["08-14", "29-31", "22-28", "01-07", "01-07"],
+        'amount': [1.0, 2.0, 3.0, 4.0, 5.0],
+    })
+
+    labelled = analytics.add_period_labels(grouped, "Weekly")
+
+    assert list(labelled['week_label']) == [
+        "01-07 Dec 2024", "22-28 Dec 2024", "29-31 Dec 2024", "01-07 Jan 2025", "08-14 Jan 2025",
+    ]
+    assert labelled['sort_key'].is_monotonic_increasing
+
+
+def test_weekly_last_bucket_sorts_after_day_28_and_before_next_month():
+    grouped = pd.DataFrame({
+        'year': [2024, 2024, 2024, 2024],
+        'month': [3, 2, 2, 2],
+        'day_week': ["01-07", "29-29", "22-28", "15-21"],
+        'amount': [1.0, 2.0, 3.0, 4.0],
+    })
+
+    labelled = analytics.add_period_labels(grouped, "Weekly")
+
+    assert list(labelled['day_week']) == ["15-21", "22-28", "29-29", "01-07"]
+    assert list(labelled['sort_key']) == [20240215, 20240222, 20240229, 20240301]
+
+
+def test_monthly_order_across_year_boundary():
+    grouped = pd.DataFrame({
+        'year': [2025, 2024, 2025, 2024],
+        'month': [2, 12, 1, 11],
+        'month_name': ["February", "December", "January", "November"],
+        'amount': [1.0, 2.0, 3.0, 4.0],
+    })
+
+    labelled = analytics.add_period_labels(grouped, "Monthly")
+
+    assert list(labelled['month_label']) == ["Nov 2024", "Dec 2024", "Jan 2025", "Feb 2025"]
+    assert list(labelled['sort_key']) == [202411, 202412, 202501, 202502]
+
@@ -0,0 +1,89 @@
+import json
+import random
+import time
+
+import apps_script_client
+import submission_queue
+from submission_queue import SubmissionQueue
+
+
+def _wait_for(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def _expense(i):
+    return {"expenseName": f"expense {i}", "category": "Groceries", "amount": 10.0 + i,
+            "date": "2024-06-01", "paymentMethod": "Cash"}
+
+
+def test_flaky_script_stores_every_submission_exactly_once(stand_in, tmp_path, monkeypatch):
+    monkeypatch.setattr(submission_queue, "RETRY_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(submission_queue, "RETRY_MAX_SECONDS", 0.01)
+    random.seed(7)
+    # Half the requests fail with a 503, half of those after the row was stored
+    script = stand_in(failure_rate=0.5)
+    failures = []
+    should_fail = script.should_fail
+
+    def counted():
+        failed = should_fail()
+        failures.append(failed)
+        return failed
+    script.should_fail = counted
+
+    queue = SubmissionQueue(str(tmp_path / "queue.jsonl"), apps_script_client.submit_json)
+    keys = [queue.enqueue(_expense(i)) for i in range(40)]
+    queue.start()
+    _wait_for(lambda: queue.pending_count() == 0)
+
+    assert any(failures)
+    assert len(script.rows) == 40
+    assert sorted(row['idempotencyKey'] for row in script.rows) == sorted(keys)
+
+
+def test_pending_entries_are_replayed_from_the_log_after_a_restart(stand_in, tmp_path):
+    script = stand_in()
+    path = str(tmp_path / "queue.jsonl")
+    # The server stops before the worker sends anything
+    stopped = SubmissionQueue(path, apps_script_client.submit_json)
+    keys = [stopped.enqueue(_expense(i)) for i in range(3)]
+    with open(path, "a", encoding="utf-8") as log:
+        log.write('{"event": "enqueued", "id": "torn')
+
+    queue = SubmissionQueue(path, apps_script_client.submit_json)
+    assert queue.pending_count() == 3
+    queue.start()
+    _wait_for(lambda: queue.pending_count() == 0)
+
+    assert [row['idempotencyKey'] for row in script.rows] == keys
+    assert [row['expenseName'] for row in script.rows] == ["expense 0", "expense 1", "expense 2"]
+
+
+def test_restart_compacts_the_log_to_pending_and_recent_sent_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(submission_queue, "KEEP_SENT", 2)
+    monkeypatch.setattr(submission_queue, "RETRY_BASE_SECONDS", 60)
+    path = str(tmp_path / "queue.jsonl")
+
+    def submit(data):
+        if data["expenseName"] == "expense 2":
+            return {"status": "error", "message": "offline"}
+        return {"status": "success"}
+
+    queue = SubmissionQueue(path, submit)
+    keys = [queue.enqueue(_expense(i)) for i in range(5)]
+    queue.start()
+    _wait_for(lambda: sum(row["status"] == "sent" for row in queue.status_rows()) == 4
+              and queue.status_rows()[2]["attempts"] == 1)
+
+    restarted = SubmissionQueue(path, submit)
+
+    assert list(restarted.entries) == [keys[2], keys[3], keys[4]]
+    assert restarted.pending_rows() == [{**_expense(2), "idempotencyKey": keys[2]}]
+    with open(path, encoding="utf-8") as log:
+        events = [json.loads(line) for line in log]
+    assert [(event["event"], event["id"]) for event in events] == [
+        ("enqueued", keys[2]), ("enqueued", keys[3]), ("sent", keys[3]), ("enqueued", keys[4]), ("sent", keys[4]),
+    ]
@@ -0,0 +1,68 @@
+import pytest
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.runnables import RunnableLambda
+
+from tweet_cache import TweetCache
+from tweet_engine import build_tweet_chain, generate_tweets, plan_requests, split_tweets, stream_tweets
+
+
+def test_plan_requests_splits_each_topic_into_calls_of_at_most_per_call():
+    assert plan_requests(["python", "rust"], 7, per_call=3) == [
+        {"number": 3, "topic": "python"}, {"number": 3, "topic": "python"}, {"number": 1, "topic": "python"},
+        {"number": 3, "topic": "rust"}, {"number": 3, "topic": "rust"}, {"number": 1, "topic": "rust"},
+    ]
+    assert plan_requests(["python"], 2, per_call=3) == [{"number": 2, "topic": "python"}]
+
+
+def test_split_tweets_handles_lists_paragraphs_and_chatter():
+    numbered = "Here are 3 tweets:\n\n1. **First** tweet\n2) Second tweet\n   continues here\n- Third #tag"
+    assert split_tweets(numbered) == ["First tweet", "Second tweet continues here", "Third #tag"]
+    assert split_tweets("One tweet\n\nAnother tweet\n") == ["One tweet", "Another tweet"]
+
+
+def test_tweets_are_deduped_across_sub_requests_and_trimmed():
+    model = FakeListChatModel(responses=["1. Tweet one\n2. Tweet two", "1. tweet TWO!\n2. Tweet three"])
+
+    results = generate_tweets(build_tweet_chain(model), ["python"], 3, per_call=2, max_concurrency=1)
+
+    assert results == {"python": ["Tweet one", "Tweet two", "Tweet three"]}
+
+    model = FakeListChatModel(responses=["1. A\n2. B\n3. C"])
+    assert generate_tweets(build_tweet_chain(model), ["python", "rust"], 2, per_call=2) == {
+        "python": ["A", "B"], "rust": ["A", "B"]}
+
+
+def test_failed_sub_requests_leave_the_other_topics():
+    model = FakeListChatModel(responses=["1. A\n2. B"])
+
+    def fail_on_rust(prompt):
+        if "rust" in prompt.to_string():
+            raise RuntimeError("rate limited")
+        return prompt
+
+    chain = build_tweet_chain(RunnableLambda(fail_on_rust) | model)
+
+    assert generate_tweets(chain, ["python", "rust"], 2) == {"python": ["A", "B"], "rust": []}
+
+
+def test_all_sub_requests_failing_raises():
+    def fail(prompt):
+        raise RuntimeError("rate limited")
+
+    chain = build_tweet_chain(RunnableLambda(fail))
+
+    with pytest.raises(RuntimeError, match="rate limited"):
+        generate_tweets(chain, ["python", "rust"], 4)
+
+
+def test_only_complete_results_are_cached(tmp_path):
+    cache = TweetCache(str(tmp_path / "tweets.sqlite"))
+    model = FakeListChatModel(responses=["1. A\n2. B\n3. C"])
+
+    generate_tweets(build_tweet_chain(model), ["python"], 3, cache=cache, model_name="fake")
+    generate_tweets(build_tweet_chain(model), ["rust"], 4, cache=cache, model_name="fake")
+    list(stream_tweets(build_tweet_chain(model), "go", 4, cache=cache, model_name="fake"))
+
+    assert cache.get("python", 3, "fake") == ["A", "B", "C"]
+    assert cache.get("rust", 4, "fake") is None
+    assert cache.get("go", 4, "fake") is None
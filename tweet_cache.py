@@ -0,0 +1,93 @@
+"""Persistent cache of generated tweets, keyed on (normalized topic, number, model).
+
+Stored in SQLite so it survives restarts and is shared by every session of
+the server. Entries expire after a TTL and the least recently used ones are
+evicted once the cache holds more than `max_entries`.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_ENTRIES = 500
+
+# Filler words that don't change what the tweets are about
+_STOP_WORDS = {"a", "an", "the", "about", "on", "of", "for", "regarding"}
+
+
+def normalize_topic(topic):
+    """Canonical form of a topic so "The  Python!" and "python" share a cache entry"""
+    words = re.sub(r"[^\w\s#@]", " ", topic.lower()).split()
+    return " ".join(word for word in words if word not in _STOP_WORDS)
+
+
+class TweetCache:
+    """SQLite-backed TTL + LRU cache for tweet lists"""
+
+    def __init__(self, path, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    tweets TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @staticmethod
+    def make_key(topic, number, model):
+        return json.dumps([normalize_topic(topic), int(number), model])
+
+    def get(self, topic, number, model):
+        """Cached tweets for the request, or None on a miss or an expired entry"""
+        key = self.make_key(topic, number, model)
+        now = time.time()
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT tweets, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, topic, number, model, tweets):
+        """Store tweets for the request and evict least recently used entries over the limit"""
+        if not tweets:
+            return
+        key = self.make_key(topic, number, model)
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, tweets, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(tweets), now, now)
+            )
+            self.connection.execute("""
+                DELETE FROM responses WHERE key IN (
+                    SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def size(self):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
@@ -0,0 +1,175 @@
+"""Concurrent tweet generation on top of the prompt | model chain.
+
+A request for N tweets on several topics is split into small sub-requests
+(at most TWEETS_PER_CALL tweets each) that run concurrently through
+chain.abatch with a bounded concurrency limit. The replies are split into
+individual tweets, deduplicated per topic and trimmed back to N.
+
+An optional TweetCache short-circuits topics that were generated before.
+
+The chain is passed in, so any chat model works, including a fake one:
+
+    from langchain_core.language_models import FakeListChatModel
+    chain = build_tweet_chain(FakeListChatModel(responses=["1. a\n2. b"]))
+    generate_tweets(chain, ["python"], 2)
+"""
+import asyncio
+import re
+import time
+import logging
+
+from langchain_core.prompts import PromptTemplate
+
+from perf_trace import span
+
+logger = logging.getLogger(__name__)
+
+# Create prompt template for generating tweets
+TWEET_TEMPLATE = "Give me {number} tweets on {topic}"
+
+# Tweets asked for in a single model call; larger requests are fanned out
+TWEETS_PER_CALL = 3
+# Model calls in flight at once
+MAX_CONCURRENCY = 4
+
+# Passed as config metadata so a rate-limiting scheduler can put streamed (interactive) calls first
+STREAM_PRIORITY = 0
+BATCH_PRIORITY = 1
+
+# "1. ", "2) ", "- ", "* " style list markers at the start of a line
+_LIST_MARKER = re.compile(r"^\s*(?:\d+[.)]|[-*•])\s+")
+
+
+def build_tweet_chain(model):
+    """Create the prompt | model chain used for tweet generation"""
+    tweet_prompt = PromptTemplate(template=TWEET_TEMPLATE, input_variables=['number', 'topic'])
+    return tweet_prompt | model
+
+
+def plan_requests(topics, number, per_call=TWEETS_PER_CALL):
+    """Split `number` tweets for each topic into sub-requests of at most `per_call`"""
+    inputs = []
+    for topic in topics:
+        remaining = number
+        while remaining > 0:
+            inputs.append({"number": min(per_call, remaining), "topic": topic})
+            remaining -= per_call
+    return inputs
+
+
+def split_tweets(text):
+    """Split a model reply into individual tweets.
+
+    Numbered or bulleted lines start a new tweet; otherwise blank lines
+    separate them. Leading chatter like "Here are 3 tweets:" is dropped.
+    """
+    tweets = []
+    current = []
+    for line in text.splitlines():
+        if _LIST_MARKER.match(line) or not line.strip():
+            if current:
+                tweets.append(" ".join(current))
+            current = []
+        stripped = _LIST_MARKER.sub("", line).replace("**", "").strip()
+        if stripped:
+            current.append(stripped)
+    if current:
+        tweets.append(" ".join(current))
+    return [tweet for tweet in tweets if not tweet.endswith(":")]
+
+
+def _dedupe_key(tweet):
+    return re.sub(r"\s+", " ", re.sub(r"[^\w#@ ]", "", tweet.lower())).strip()
+
+
+def _reply_text(reply):
+    content = getattr(reply, "content", reply)
+    if isinstance(content, list):
+        # Some chat models return content as a list of parts
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return str(content)
+
+
+async def agenerate_tweets(chain, topics, number, per_call=TWEETS_PER_CALL, max_concurrency=MAX_CONCURRENCY,
+                           cache=None, model_name=""):
+    """Generate `number` tweets per topic concurrently; returns {topic: [tweets]}"""
+    cached = {}
+    if cache is not None:
+        with span("tweets.cache_lookup", topics=len(topics)) as record:
+            for topic in topics:
+                tweets = cache.get(topic, number, model_name)
+                if tweets is not None:
+                    cached[topic] = tweets
+            record["hits"] = len(cached)
+    missing = [topic for topic in topics if topic not in cached]
+    if not missing:
+        return {topic: cached[topic] for topic in topics}
+
+    inputs = plan_requests(missing, number, per_call)
+    # Covers the whole fan-out, including time queued in the rate-limiting scheduler
+    with span("tweets.model_calls", calls=len(inputs)):
+        replies = await chain.abatch(
+            inputs, config={"max_concurrency": max_concurrency, "metadata": {"priority": BATCH_PRIORITY}},
+            return_exceptions=True
+        )
+
+    results = {topic: [] for topic in missing}
+    seen = {topic: set() for topic in missing}
+    failures = []
+    with span("tweets.split", rows=len(inputs)):
+        for request, reply in zip(inputs, replies):
+            if isinstance(reply, Exception):
+                logger.warning(f"Tweet sub-request for {request['topic']!r} failed: {str(reply)}")
+                failures.append(reply)
+                continue
+            for tweet in split_tweets(_reply_text(reply)):
+                key = _dedupe_key(tweet)
+                if key and key not in seen[request["topic"]]:
+                    seen[request["topic"]].add(key)
+                    results[request["topic"]].append(tweet)
+
+    if failures and len(failures) == len(inputs):
+        raise failures[0]
+    if cache is not None and not failures:
+        # A short list (the model returned fewer distinct tweets) would be served until it expires
+        for topic in missing:
+            if len(results[topic]) >= number:
+                cache.put(topic, number, model_name, results[topic][:number])
+    return {topic: cached[topic] if topic in cached else results[topic][:number] for topic in topics}
+
+
+def stream_tweets(chain, topic, number, stats=None, cache=None, model_name=""):
+    """Yield reply text as the model streams it, for st.write_stream.
+
+    If a `stats` dict is given it receives time_to_first_token, total_seconds
+    and whether the reply came from the cache once the stream finishes.
+    """
+    stats = stats if stats is not None else {}
+    started = time.perf_counter()
+    cached = cache.get(topic, number, model_name) if cache is not None else None
+    stats["cached"] = cached is not None
+    if cached is not None:
+        stats["time_to_first_token"] = stats["total_seconds"] = time.perf_counter() - started
+        yield "\n".join(f"{position}. {tweet}" for position, tweet in enumerate(cached, start=1))
+        return
+
+    reply = []
+    for chunk in chain.stream({"number": number, "topic": topic}, config={"metadata": {"priority": STREAM_PRIORITY}}):
+        text = _reply_text(chunk)
+        if not text:
+            continue
+        if "time_to_first_token" not in stats:
+            stats["time_to_first_token"] = time.perf_counter() - started
+            logger.info(f"First token for {topic!r} after {stats['time_to_first_token']:.2f}s")
+        reply.append(text)
+        yield text
+    stats["total_seconds"] = time.perf_counter() - started
+    tweets = split_tweets("".join(reply))
+    if cache is not None and len(tweets) >= number:
+        cache.put(topic, number, model_name, tweets[:number])
+
+
+def generate_tweets(chain, topics, number, per_call=TWEETS_PER_CALL, max_concurrency=MAX_CONCURRENCY,
+                    cache=None, model_name=""):
+    """Blocking wrapper around agenerate_tweets for Streamlit's script thread"""
+    return asyncio.run(agenerate_tweets(chain, topics, number, per_call, max_concurrency, cache, model_name))
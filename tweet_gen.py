@@ -1,5 +1,9 @@
 import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+import sys
+import streamlit as st
+
+from perf_trace import span
+from tweet_cache import TweetCache
 
 # Set the API key directly in the script
 if "GOOGLE_API_KEY" not in os.environ:
@@ -11,35 +15,82 @@ api_key = os.environ.get("GOOGLE_API_KEY")
 if not api_key:
     raise ValueError("GOOGLE_API_KEY is not set")
 
-# Initialize Gemini model
-gemini_model = ChatGoogleGenerativeAI(
-    model="gemini-1.5-pro",
-    google_api_key=api_key
-)
-
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain import LLMChain
-from langchain import PromptTemplate
-
-# Create prompt template for generating tweets
-tweet_template = "Give me {number} tweets on {topic}"
+MODEL_NAME = "gemini-1.5-pro"
 
-tweet_prompt = PromptTemplate(template = tweet_template, input_variables = ['number', 'topic'])
+# The langchain / Gemini stack is imported and the model built on the first Generate
+# click, once per server process, so the page itself renders without waiting for it
+@st.cache_resource(show_spinner="Loading Gemini...")
+def get_tweet_chain():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from tweet_engine import build_tweet_chain
+    from gemini_scheduler import ScheduledModel, scheduler
 
-# Create LLM chain using the prompt template and model
-tweet_chain = tweet_prompt | gemini_model
+    # Initialize Gemini model
+    gemini_model = ChatGoogleGenerativeAI(
+        model=MODEL_NAME,
+        google_api_key=api_key
+    )
+    # Create LLM chain using the prompt template and model; every call waits its turn
+    # in the process-wide rate limiter
+    return build_tweet_chain(ScheduledModel(gemini_model, scheduler))
 
+# On-disk cache of generated tweets, shared by all sessions of this server
+@st.cache_resource
+def get_tweet_cache():
+    return TweetCache(os.environ.get(
+        "TWEET_CACHE_PATH",
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), ".tweet_cache", "responses.sqlite")
+    ))
 
-import streamlit as st
+tweet_cache = get_tweet_cache()
 
 st.header("🐦 Tweet Generator")
 
 st.subheader("Generate tweets using Generative AI 🤖")
 
-topic = st.text_input("Topic")
+topic = st.text_input("Topic", help = "Separate several topics with commas")
 
 number = st.number_input("Number of tweets", min_value = 1, max_value = 10, value = 1, step = 1)
 
+stream_output = st.toggle("Stream output", value = True, help = "Show tweets as they are written instead of all at once")
+
 if st.button("Generate"):
-    tweets = tweet_chain.invoke({"number" : number, "topic" : topic})
-    st.write(tweets.content)
+    topics = [name.strip() for name in topic.split(",") if name.strip()]
+    # One trace per click, shown in the Debug tab's performance panel
+    with span("generate_tweets", topics=len(topics), number=int(number), stream=stream_output):
+        with span("tweets.load_chain"):
+            tweet_chain = get_tweet_chain()
+        from tweet_engine import generate_tweets, stream_tweets
+        if stream_output:
+            # Render tokens as they arrive, one topic after another
+            for name in topics:
+                if len(topics) > 1:
+                    st.subheader(name)
+                stats = {}
+                with span("tweets.stream", topic=name) as record:
+                    st.write_stream(stream_tweets(tweet_chain, name, int(number), stats, tweet_cache, MODEL_NAME))
+                    record["cached"] = stats.get("cached", False)
+                    if "time_to_first_token" in stats:
+                        record["time_to_first_token_ms"] = round(stats["time_to_first_token"] * 1000, 3)
+                if stats.get("cached"):
+                    st.caption("Served from cache")
+                elif "time_to_first_token" in stats:
+                    st.caption(f"First token in {stats['time_to_first_token']:.2f}s · done in {stats['total_seconds']:.2f}s")
+        else:
+            # Large requests and multiple topics are fanned out as concurrent model calls
+            tweets_by_topic = generate_tweets(tweet_chain, topics, int(number), cache=tweet_cache, model_name=MODEL_NAME)
+            for name, tweets in tweets_by_topic.items():
+                if len(tweets_by_topic) > 1:
+                    st.subheader(name)
+                for tweet in tweets:
+                    st.write(tweet)
+
+st.caption(f"Cache: {tweet_cache.hits} hits · {tweet_cache.misses} misses · {tweet_cache.size()} stored")
+
+# The scheduler only exists once the Gemini stack has been loaded
+gemini_scheduler = sys.modules.get("gemini_scheduler")
+if gemini_scheduler is not None:
+    scheduler_stats = gemini_scheduler.scheduler.stats()
+    st.caption(f"Gemini queue: {scheduler_stats['queue_depth']} waiting · "
+               f"last wait {scheduler_stats['last_wait']:.1f}s · avg wait {scheduler_stats['avg_wait']:.1f}s · "
+               f"{scheduler_stats['rate_limited']} rate-limit retries")